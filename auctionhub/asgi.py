@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auctionhub.settings')
+os.environ.setdefault('AUCTIONHUB_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Pay first-request costs (URLconfs, templates, order books) before serving or forking
+from django.conf import settings  # noqa: E402
+
+from auctionhub.metrics import enable as enable_metrics  # noqa: E402
+from auctionhub.warmup import warm_up  # noqa: E402
+
+if settings.WARM_UP_ON_STARTUP:
+    warm_up()
+# Only server processes (this module, runserver included) record metrics; other commands do not
+enable_metrics()
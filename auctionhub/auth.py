@@ -0,0 +1,41 @@
+"""
+Cached user lookups for auctionhub.
+
+Django loads ``request.user`` with a query on every authenticated request.
+CachedModelBackend keeps users in the cache for ``USER_CACHE_TIMEOUT``
+seconds instead. Saving or deleting a user drops the cached copy, so
+password changes (and with them the session auth hash) and deactivations
+take effect on the next request. With a per-process cache such as
+LocMemCache that holds only for the process that made the change; other
+processes catch up within the timeout.
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+post_save.connect(invalidate_user, sender=User, dispatch_uid='auctionhub.auth.invalidate_user')
+post_delete.connect(invalidate_user, sender=User, dispatch_uid='auctionhub.auth.invalidate_user_deleted')
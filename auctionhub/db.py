@@ -0,0 +1,163 @@
+"""
+Primary/replica database routing for auctionhub.
+
+Writes always go to the ``default`` (primary) alias; reads made while
+serving a request are spread over the aliases in
+``settings.DATABASE_REPLICAS``. POST, PUT, PATCH and DELETE requests read
+from the primary throughout, since what they read is what they write back.
+A request that writes pins its user to the primary for
+``REPLICA_PIN_SECONDS`` through a signed cookie, so a bidder sees their
+own bid even while replicas lag behind. Every connection also
+counts queries and time per alias.
+"""
+
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import Histogram
+
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+PIN_COOKIE_SALT = 'auctionhub.db.pin'
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+_request_state = ContextVar('auctionhub_db_request_state', default=None)
+_metrics = defaultdict(lambda: {'queries': 0, 'seconds': 0.0})
+_metrics_lock = threading.Lock()
+
+QUERY_SECONDS = Histogram('auctionhub_db_query_seconds', 'Time per database query, by alias',
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+
+class RequestState:
+    """What the current request has done to the databases so far"""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        self.queries = defaultdict(lambda: {'queries': 0, 'seconds': 0.0})
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        # Management commands and task workers read-modify-write, so only web requests use replicas
+        if not settings.DATABASE_REPLICAS or state is None or state.pinned:
+            return PRIMARY
+        # Reads inside a transaction must see that transaction's writes
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            # The rest of this request, and the pin window after it, read from the primary
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary, never from migrate
+        return db == PRIMARY
+
+
+class ReplicaPinningMiddleware:
+    """Track per-request reads and writes and keep recent writers on the primary
+
+    Sits above SessionMiddleware so session saves count as writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(pinned=self.is_pinned(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_signed_cookie(
+                PIN_COOKIE, '1', salt=PIN_COOKIE_SALT, max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        if settings.DEBUG and state.queries:
+            response.headers['Server-Timing'] = ', '.join(
+                f'db-{alias};dur={m["seconds"] * 1000:.1f};desc="{m["queries"]} queries"'
+                for alias, m in state.queries.items()
+            )
+        return response
+
+    @staticmethod
+    def is_pinned(request):
+        # An update view's get_object() and checks must not read a lagging copy it then saves back
+        if request.method not in SAFE_METHODS:
+            return True
+        if PIN_COOKIE not in request.COOKIES:
+            return False
+        try:
+            # The signature's timestamp, not the browser, enforces the window
+            request.get_signed_cookie(PIN_COOKIE, salt=PIN_COOKIE_SALT, max_age=settings.REPLICA_PIN_SECONDS)
+        except BadSignature:
+            return False
+        return True
+
+
+# ============================================
+# PER-ALIAS QUERY METRICS
+# ============================================
+
+def _record_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        alias = context['connection'].alias
+        with _metrics_lock:
+            _metrics[alias]['queries'] += 1
+            _metrics[alias]['seconds'] += elapsed
+        QUERY_SECONDS.observe(elapsed, alias=alias)
+        state = _request_state.get()
+        if state is not None:
+            state.queries[alias]['queries'] += 1
+            state.queries[alias]['seconds'] += elapsed
+
+
+def _install_query_metrics(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_metrics)
+
+
+def query_metrics():
+    """Queries run and seconds spent per database alias by this process"""
+    with _metrics_lock:
+        return {alias: dict(m) for alias, m in _metrics.items()}
+
+
+def request_queries():
+    """Queries the current request has run so far, or None outside a request"""
+    state = _request_state.get()
+    if state is None:
+        return None
+    return sum(m['queries'] for m in state.queries.values())
@@ -0,0 +1,159 @@
+"""
+Media (uploaded file) serving for auctionhub.
+
+``serve_media`` answers conditional requests (If-None-Match and
+If-Modified-Since) with 304s and single byte ranges with 206s. The body is
+never read into Python: behind nginx, ``MEDIA_ACCEL_REDIRECT`` names an
+internal location aliased to MEDIA_ROOT and the view only sends an
+X-Accel-Redirect header. Otherwise the open file goes out through
+FileResponse, which WSGI servers such as gunicorn hand to ``os.sendfile``
+via ``wsgi.file_wrapper``; ranges keep that path because the file is seeked
+to the start of the range and the length comes from Content-Length.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """A read-only view of bytes [start, start + length) of an open file
+
+    fileno() is passed through, so sendfile-capable servers send straight
+    from the descriptor, which is positioned at start.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_path(path):
+    """Absolute path of a servable media file, or raise Http404"""
+    parts = path.split('/')
+    if parts[0] not in settings.MEDIA_SERVED_DIRS or any(part.startswith('.') for part in parts):
+        raise Http404('Not found')
+    try:
+        return safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+
+
+def file_etag(st):
+    return quote_etag(f'{st.st_mtime_ns:x}-{st.st_size:x}')
+
+
+def etag_matches(header, etag):
+    """If-None-Match comparison, which is weak: W/ prefixes are ignored"""
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def byte_range(header, size):
+    """(start, end) of a single-range Range header; None to send everything; False if unsatisfiable"""
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None  # Malformed or multiple ranges: a full response is always allowed
+    first, last = match.groups()
+    if not first:
+        if not last or int(last) == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def if_range_matches(header, etag, mtime):
+    if header.startswith(('"', 'W/')):
+        return header == etag  # Strong comparison; our ETags are never weak
+    date = parse_http_date_safe(header)
+    return date is not None and int(mtime) <= date
+
+
+@require_safe
+def serve_media(request, path):
+    full_path = media_path(path)
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        raise Http404('Not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('Not found')
+
+    etag = file_etag(st)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}',
+        'Accept-Ranges': 'bytes',
+    }
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if (etag_matches(if_none_match, etag) if if_none_match is not None
+            else not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), st.st_mtime)):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # nginx sends the file, including any Range, from its internal location
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response.headers['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + path
+        return response
+
+    start, end = 0, st.st_size - 1
+    status = 200
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and st.st_size and if_range_matches(request.META.get('HTTP_IF_RANGE', etag), etag, st.st_mtime):
+        requested = byte_range(range_header, st.st_size)
+        if requested is False:
+            response = HttpResponse(status=416, headers=headers)
+            response.headers['Content-Range'] = f'bytes */{st.st_size}'
+            return response
+        if requested is not None:
+            start, end = requested
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+
+    length = end - start + 1 if st.st_size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status, content_type=content_type, headers=headers)
+    else:
+        response = FileResponse(
+            FileRange(open(full_path, 'rb'), start, length), status=status, content_type=content_type,
+            headers=headers,
+        )
+    response.headers['Content-Length'] = str(length)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,315 @@
+"""
+Process-shared metrics for auctionhub in the Prometheus text format.
+
+Counters and histograms are plain float64 slots in a memory-mapped file
+that belongs to the process writing them (``METRICS_DIR/<pid>.db``), so
+recording a sample is a dict lookup and an in-place write, with no locks
+across processes. ``/metrics`` reads every process's file and adds them up,
+so whichever worker answers the scrape reports the totals for all of them.
+Only server processes record: wsgi.py and asgi.py call ``enable()``, so
+management commands neither add files nor mix their queries into the
+request metrics. Counts of workers that have exited still belong in the
+totals; the next scrape folds their files into ``merged.db`` and deletes
+them, so the directory holds one file per live worker plus that one.
+
+File layout: an 8-byte header holding the bytes in use, then entries of a
+4-byte key length, the UTF-8 key padded to 8 bytes and the 8-byte value.
+Entries are only ever appended and the header is written after the entry,
+so a reader never sees a half-written one.
+"""
+
+import bisect
+import fcntl
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HEADER = struct.Struct('q')
+_KEY_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+_MERGED = 'merged.db'
+
+
+class _ProcessFile:
+    """This process's memory-mapped value slots"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < _INITIAL_SIZE:
+            self.file.truncate(_INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = _HEADER.unpack_from(self.map, 0)[0] or _HEADER.size
+        self.offsets = {key: offset for key, _, offset in _entries(self.map, self.used)}
+
+    def add(self, key, amount):
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self.append(key)
+        _VALUE.pack_into(self.map, offset, _VALUE.unpack_from(self.map, offset)[0] + amount)
+
+    def append(self, key):
+        encoded = key.encode()
+        padded = _KEY_LENGTH.size + len(encoded)
+        padded += -padded % 8
+        needed = self.used + padded + _VALUE.size
+        if needed > len(self.map):
+            size = len(self.map)
+            while size < needed:
+                size *= 2
+            self.map.resize(size)  # Grows the file too
+        _KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + _KEY_LENGTH.size:self.used + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self.used + padded
+        _VALUE.pack_into(self.map, offset, 0.0)
+        self.used = offset + _VALUE.size
+        _HEADER.pack_into(self.map, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def _entries(data, used):
+    position = _HEADER.size
+    while position < used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        key = bytes(data[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length]).decode()
+        offset = position + _KEY_LENGTH.size + length
+        offset += -offset % 8
+        yield key, _VALUE.unpack_from(data, offset)[0], offset
+        position = offset + _VALUE.size
+
+
+_file = None
+_file_lock = threading.Lock()
+_enabled = False
+
+
+def enable():
+    """Record samples from this process (and the workers forked from it) on"""
+    global _enabled
+    _enabled = True
+
+
+def _add(key, amount):
+    global _file
+    if not _enabled:
+        return
+    with _file_lock:
+        if _file is None:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _file = _ProcessFile(os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db'))
+        _file.add(key, amount)
+
+
+def _forget_parent_file():
+    # A forked worker must not write into its parent's file
+    global _file, _file_lock
+    _file = None
+    _file_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_parent_file)
+
+
+# ============================================
+# METRIC TYPES
+# ============================================
+
+_registry = {}
+
+
+def _key(sample, labels):
+    return json.dumps([sample, sorted(labels.items())], separators=(',', ':'))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        _add(_key(self.name, labels), amount)
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.bucket_labels = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        # Buckets are stored per bucket and made cumulative when rendered
+        le = self.bucket_labels[bisect.bisect_left(self.buckets, value)]
+        _add(_key(self.name + '_bucket', {**labels, 'le': le}), 1)
+        _add(_key(self.name + '_sum', labels), value)
+        _add(_key(self.name + '_count', labels), 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+_collectors = []
+
+
+def collector(func):
+    """Register a function called at scrape time that returns [(name, type, help, [(labels, value)])]"""
+    _collectors.append(func)
+    return func
+
+
+# ============================================
+# EXPOSITION
+# ============================================
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, under another user
+    return True
+
+
+@contextmanager
+def _merge_lock(directory):
+    """Held across a merge and the read that follows, so no scrape sees a file both merged and not yet deleted"""
+    with open(os.path.join(directory, 'merge.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def merge_dead_files(directory):
+    """Fold the files of exited processes into merged.db and delete them; the caller holds _merge_lock"""
+    merged = None
+    try:
+        for filename in os.listdir(directory):
+            pid = filename[:-len('.db')]
+            if not filename.endswith('.db') or not pid.isdigit() or _alive(int(pid)):
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if merged is None:
+                merged = _ProcessFile(os.path.join(directory, _MERGED))
+            if len(data) >= _HEADER.size:
+                for key, value, _ in _entries(data, min(_HEADER.unpack_from(data, 0)[0], len(data))):
+                    merged.add(key, value)
+            os.remove(path)
+    finally:
+        if merged is not None:
+            merged.close()
+
+
+def aggregate():
+    """Every sample summed over all process files"""
+    totals = defaultdict(float)
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return totals
+    with _merge_lock(directory):
+        merge_dead_files(directory)
+        for filename in os.listdir(directory):
+            if not filename.endswith('.db'):
+                continue
+            try:
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if len(data) < _HEADER.size:
+                continue
+            for key, value, _ in _entries(data, min(_HEADER.unpack_from(data, 0)[0], len(data))):
+                totals[key] += value
+    return totals
+
+
+def render():
+    samples = defaultdict(dict)  # Sample name -> {sorted label pairs: value}
+    for key, value in aggregate().items():
+        sample, labels = json.loads(key)
+        samples[sample][tuple(map(tuple, labels))] = value
+
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        lines += [f'# HELP {name} {metric.documentation}', f'# TYPE {name} {metric.type}']
+        if metric.type == 'counter':
+            lines += [_sample(name, dict(labels), value) for labels, value in sorted(samples[name].items())]
+            continue
+        buckets = defaultdict(dict)
+        for labels, value in samples[name + '_bucket'].items():
+            labels = dict(labels)
+            le = labels.pop('le')
+            buckets[tuple(sorted(labels.items()))][le] = value
+        for labels, count in sorted(samples[name + '_count'].items()):
+            cumulative = 0
+            for le in metric.bucket_labels:
+                cumulative += buckets[labels].get(le, 0)
+                lines.append(_sample(name + '_bucket', {**dict(labels), 'le': le}, cumulative))
+            lines.append(_sample(name + '_sum', dict(labels), samples[name + '_sum'].get(labels, 0)))
+            lines.append(_sample(name + '_count', dict(labels), count))
+
+    for func in _collectors:
+        for name, metric_type, documentation, values in func():
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}']
+            lines += [_sample(name, labels, value) for labels, value in values]
+    return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if value == int(value) and abs(value) < 1e15:
+        return f'{value:.1f}' if isinstance(value, float) else str(value)
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(f'{key}="{_escape(label)}"' for key, label in sorted(labels.items())) + '}'
+    return f'{name} {_format_value(value)}'
+
+
+def _authorized(request):
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+    # Behind a reverse proxy every request comes from the proxy, so this is only for direct serving
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
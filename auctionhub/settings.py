@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'auctionhub.staticfiles.PrecompressedStaticMiddleware',
+    'auctionhub.db.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,7 +63,6 @@ TEMPLATES = [
         'DIRS': [
             BASE_DIR / 'static/templates'
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -69,11 +70,26 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; product cards and the detail
+            # panel are additionally fragment-cached on Product.version
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'auctionhub.wsgi.application'
+ASGI_APPLICATION = 'auctionhub.asgi.application'
+
+# Serve the async product list/detail views (set by auctionhub/asgi.py)
+ASYNC_VIEWS = os.environ.get('AUCTIONHUB_ASYNC_VIEWS') == '1'
+
+# Preload URLconfs, templates and order books when wsgi.py/asgi.py is imported (auctionhub/warmup.py)
+WARM_UP_ON_STARTUP = os.environ.get('AUCTIONHUB_WARM_UP', '1') == '1'
 
 
 # Database
@@ -86,6 +102,76 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. AUCTIONHUB_DB_REPLICAS=replica1,replica2. Locally each is a SQLite
+# copy of the primary refreshed by `manage.py sync_replicas`; in production point the
+# aliases at real streaming replicas instead.
+DATABASE_REPLICAS = [alias for alias in os.environ.get('AUCTIONHUB_DB_REPLICAS', '').split(',') if alias]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db.{alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['auctionhub.db.PrimaryReplicaRouter']
+
+# Seconds a user reads from the primary after a request of theirs wrote (e.g. a bid)
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# 'shared' is one memory-mapped file that every worker process on the host reads and
+# writes (auctionhub/sharedcache.py), so invalidations reach all of them; point
+# AUCTIONHUB_CACHE_PATH at tmpfs (e.g. /dev/shm/auctionhub.cache) in production.
+# 'locmem' is Django's per-process cache.
+CACHE_BACKEND = os.environ.get('AUCTIONHUB_CACHE_BACKEND', 'shared')
+CACHES = {
+    'default': {
+        'BACKEND': 'auctionhub.sharedcache.SharedMemoryCache',
+        'LOCATION': os.environ.get('AUCTIONHUB_CACHE_PATH', str(BASE_DIR / 'cache' / 'shared.cache')),
+    } if CACHE_BACKEND == 'shared' else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a product/sale detail build is shared before it is rebuilt; bids invalidate it sooner
+HOT_PAGE_CACHE_TIMEOUT = 10
+
+# Seconds the product sidebar facet counts are reused for the same filter set
+FACET_CACHE_TIMEOUT = 30
+
+# Seconds a user's set of watched product ids is reused; their own changes drop it at once
+WATCHLIST_CACHE_TIMEOUT = 60
+
+
+# Sessions, flash messages and request.user
+# https://docs.djangoproject.com/en/5.0/topics/http/sessions/#configuring-the-session-engine
+
+# 'cached_db' reads sessions from the cache and only touches the table on a miss;
+# 'signed_cookies' keeps them client-side; 'db' is Django's default. With a per-process
+# cache, sessions and users are only as fresh as USER_CACHE_TIMEOUT across workers.
+SESSION_BACKEND = os.environ.get('AUCTIONHUB_SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+
+# Flash messages travel in a signed cookie, so showing one never writes the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# request.user comes from the cache (see auctionhub/auth.py)
+AUTHENTICATION_BACKENDS = ['auctionhub.auth.CachedModelBackend']
+USER_CACHE_TIMEOUT = 60
+
+
+# Prometheus metrics (auctionhub/metrics.py): each server process writes its own file in
+# METRICS_DIR and /metrics adds them up, so every worker process on the host must share the
+# directory (and only they: files of PIDs not running here are merged away as exited)
+METRICS_DIR = os.environ.get('AUCTIONHUB_METRICS_DIR', str(BASE_DIR / 'metrics'))
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>". Without a token, only clients
+# connecting straight from METRICS_ALLOWED_IPS (none by default) may read /metrics
+METRICS_TOKEN = os.environ.get('AUCTIONHUB_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('AUCTIONHUB_METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -126,6 +212,17 @@ STATICFILES_DIRS = [
  BASE_DIR / 'static',
 
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes hashed names plus .gz/.br variants (see auctionhub/staticfiles.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'auctionhub.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -134,4 +231,55 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploaded files are served by auctionhub/media.py, only from these MEDIA_ROOT subdirectories.
+# Behind nginx, set AUCTIONHUB_MEDIA_ACCEL_REDIRECT to an internal location aliased to
+# MEDIA_ROOT (e.g. /protected-media/) so nginx sends the bytes instead of the app.
+MEDIA_SERVED_DIRS = ['product_images']
+MEDIA_ACCEL_REDIRECT = os.environ.get('AUCTIONHUB_MEDIA_ACCEL_REDIRECT', '')
+# Photos are resized in place shortly after upload, so they are revalidated rather than immutable
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Longest side, in pixels, that uploaded product photos are shrunk to in the background
+PRODUCT_IMAGE_MAX_SIZE = 1600
+MAX_PRODUCT_IMAGES = 12
+
+# Uploads stream to a temporary file and are hashed on the way (see auctions/uploads.py)
+FILE_UPLOAD_HANDLERS = ['auctions.uploads.HashingFileUploadHandler']
+
+# Settled sales are moved to the archive tables this many days after bidding closes
+ARCHIVE_AFTER_DAYS = 90
+
+# In-memory order book (auctions/orderbook.py): bids kept per product, seconds before a
+# rejecting book is rechecked against the database, and how many products are held
+ORDER_BOOK_DEPTH = 10
+ORDER_BOOK_MAX_AGE = 30
+ORDER_BOOK_MAX_PRODUCTS = 10000
+# Times a bid is re-judged on a reloaded book after losing a race to another bid
+ORDER_BOOK_RETRIES = 3
+
+# Seconds before bid increments and category limits are recompiled (edits in this
+# process apply at once; see auctions/rules.py)
+BID_RULES_TTL = 60
+
+# Metal price repricing (auctions/pricing.py): units re-appraised per short write
+# transaction, and seconds paused between batches so bids get the database in between
+REPRICE_BATCH_SIZE = 500
+REPRICE_PAUSE = 0.05
+
+# Admin changelists (auctions/admin.py) count at most this many rows, and bulk actions
+# write this many rows per transaction
+ADMIN_COUNT_LIMIT = 10000
+ADMIN_ACTION_BATCH_SIZE = 1000
+
+# Unit ID lookup (auctions/unitsearch.py): at most this many trigram index rows are read
+# per lookup, and matches sharing less than this share of trigrams are dropped
+UNIT_LOOKUP_CANDIDATES = 20000
+UNIT_LOOKUP_THRESHOLD = 0.3
+
+# Intake sync (auctions/intake.py): most records per request, most bytes a compressed
+# batch may inflate to, and the bidding window given to units synced without an end time
+INTAKE_SYNC_MAX_RECORDS = 5000
+INTAKE_SYNC_MAX_BYTES = 20 * 1024 * 1024
+INTAKE_LISTING_DAYS = 30
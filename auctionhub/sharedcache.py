@@ -0,0 +1,398 @@
+"""
+A Django cache backend shared by every worker process on the host.
+
+Entries live in one memory-mapped file (put it on tmpfs, e.g. /dev/shm), so
+all workers see the same hot pages, sessions and users, and a delete in one
+worker is a miss in every other. No server process is involved.
+
+The file is a set-associative hash table. A key's BLAKE2b digest picks one
+of ``SETS`` sets; each set has a few slots in every size class
+(``SIZE_CLASSES``, a list of (slot bytes, slots per set)) and a value goes
+in the smallest class it fits, so small values don't take big slots. When
+a set's slots in that class are all live, the least recently used one is
+overwritten. Values bigger than the largest class are not cached. Each set
+keeps the digests of its slots side by side, so a lookup is one
+``bytes.find`` however many slots the set has.
+
+Writers lock only the key's set: a thread lock inside the process plus an
+fcntl byte-range lock on the set's sequence number across processes.
+Readers take no lock. A writer makes its set's sequence number odd while it
+writes and even again when done; a reader copies the entry and keeps it
+only if the sequence was even and unchanged and the value's CRC matches,
+and otherwise retries.
+
+Every process using the file must be configured with the same OPTIONS;
+a file with a different layout is wiped and rebuilt when opened.
+
+The file holds pickled sessions and users, and unpickling runs code, so it
+is created 0600 and only attached when it belongs to this user and nobody
+else can write it or replace it in its directory.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import stat
+import struct
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+MAGIC = b'AHCACHE2'
+PAGE = 4096
+DEFAULT_SETS = 256
+# (slot bytes, slots per set); with 256 sets: 8192 entries up to 1 KB, 2048 up to 16 KB and
+# 256 up to 256 KB, in a 104 MB sparse file
+DEFAULT_SIZE_CLASSES = [(1024, 32), (16384, 8), (262144, 1)]
+COMPRESS_MIN = 1024
+READ_RETRIES = 3
+
+_HEADER = struct.Struct('<8sII')  # magic, sets, number of size classes
+_SIZE_CLASS = struct.Struct('<II')  # slot bytes, slots per set
+_SEQUENCE = struct.Struct('<Q')
+_DIGEST_SIZE = 16
+_EMPTY = bytes(_DIGEST_SIZE)
+# expiry (0: never), last used (monotonic ns), value length, CRC-32, flags
+_SLOT = struct.Struct('<dQIII')
+_USED = struct.Struct('<Q')
+_USED_OFFSET = 8
+_SLOT_HEADER = 32
+_COMPRESSED = 1
+
+
+def _round_up(size):
+    return -(-size // PAGE) * PAGE
+
+
+def _check_private(path, file_stat, directory_stat):
+    """Refuse a cache file another user could write, or swap for one of their own"""
+    if file_stat.st_uid != os.geteuid():
+        raise ImproperlyConfigured(f'Shared cache file {path} belongs to another user')
+    if file_stat.st_mode & 0o022:
+        raise ImproperlyConfigured(f'Shared cache file {path} is writable by other users')
+    if directory_stat.st_uid not in (0, os.geteuid()):
+        raise ImproperlyConfigured(f'Directory of shared cache file {path} belongs to another user')
+    # Others may write the directory only if it is sticky (like /dev/shm), which keeps them from replacing the file
+    if directory_stat.st_mode & 0o022 and not directory_stat.st_mode & stat.S_ISVTX:
+        raise ImproperlyConfigured(f'Directory of shared cache file {path} is writable by other users')
+
+
+class _Table:
+    """The mapped file and where each set's sequence number, digests and slots are"""
+
+    def __init__(self, path, sets, size_classes):
+        self.sets = sets
+        self.ways = sum(ways for _, ways in size_classes)
+        header = _HEADER.pack(MAGIC, sets, len(size_classes)) + b''.join(
+            _SIZE_CLASS.pack(slot_size, ways) for slot_size, ways in size_classes
+        )
+        self.sequences = _round_up(len(header))
+        self.digests = self.sequences + _round_up(sets * _SEQUENCE.size)
+        offset = self.digests + _round_up(sets * self.ways * _DIGEST_SIZE)
+        # Per way of a set: (size class, offset of the way's slot in set 0, stride between sets, slot bytes)
+        self.way_slots = []
+        for size_class, (slot_size, ways) in enumerate(size_classes):
+            for way in range(ways):
+                self.way_slots.append((size_class, offset + way * slot_size, ways * slot_size, slot_size))
+            offset += _round_up(sets * ways * slot_size)
+        size = offset
+
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        self.file = os.fdopen(self.fd, 'r+b')
+        try:
+            _check_private(path, os.fstat(self.fd), os.stat(directory))
+        except ImproperlyConfigured:
+            self.file.close()
+            raise
+        os.fchmod(self.fd, 0o600)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            self.file.seek(0)
+            if self.file.read(len(header)) != header or os.fstat(self.fd).st_size != size:
+                # New file or another layout: start empty (the file stays sparse until written)
+                self.file.truncate(0)
+                self.file.truncate(size)
+                self.file.seek(0)
+                self.file.write(header)
+                self.file.flush()
+            self.map = mmap.mmap(self.fd, size)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        self.thread_locks = [threading.Lock() for _ in range(sets)]
+
+    def digest_offset(self, index):
+        return self.digests + index * self.ways * _DIGEST_SIZE
+
+    def find(self, index, digest):
+        """Way of digest in set index, or None"""
+        start = self.digest_offset(index)
+        digests = self.map[start:start + self.ways * _DIGEST_SIZE]
+        position = digests.find(digest)
+        while position != -1 and position % _DIGEST_SIZE:
+            position = digests.find(digest, position + 1)
+        return None if position == -1 else position // _DIGEST_SIZE
+
+    def slot(self, index, way):
+        _, first, stride, slot_size = self.way_slots[way]
+        return first + index * stride, slot_size
+
+    def set_digest(self, index, way, digest):
+        offset = self.digest_offset(index) + way * _DIGEST_SIZE
+        self.map[offset:offset + _DIGEST_SIZE] = digest
+
+    def sequence(self, index):
+        return _SEQUENCE.unpack_from(self.map, self.sequences + index * _SEQUENCE.size)[0]
+
+    def lock(self, index):
+        self.thread_locks[index].acquire()
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, _SEQUENCE.size, self.sequences + index * _SEQUENCE.size)
+        except BaseException:
+            self.thread_locks[index].release()
+            raise
+        self._bump(index)
+
+    def unlock(self, index):
+        self._bump(index)
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, _SEQUENCE.size, self.sequences + index * _SEQUENCE.size)
+        self.thread_locks[index].release()
+
+    def _bump(self, index):
+        offset = self.sequences + index * _SEQUENCE.size
+        _SEQUENCE.pack_into(self.map, offset, _SEQUENCE.unpack_from(self.map, offset)[0] + 1)
+
+
+# One table per file and layout per process: Django builds a backend per thread, and fcntl
+# locks belong to the process, so threads must share the table and its thread locks
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _get_table(path, sets, size_classes):
+    key = (path, sets, tuple(size_classes))
+    table = _tables.get(key)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(key)
+            if table is None:
+                table = _tables[key] = _Table(path, sets, size_classes)
+    return table
+
+
+def _forget_tables():
+    # A parent thread may have held a set lock at fork time; the child maps the file afresh
+    global _tables_lock
+    _tables.clear()
+    _tables_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_tables)
+
+
+class SharedMemoryCache(BaseCache):
+    """Cache backend over a memory-mapped file shared by all processes; LOCATION is its path
+
+    OPTIONS are SETS and SIZE_CLASSES (see the module docstring); capacity
+    is fixed by them, so MAX_ENTRIES and CULL_FREQUENCY do not apply.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.sets = options.get('SETS', DEFAULT_SETS)
+        self.size_classes = [tuple(size_class) for size_class in options.get('SIZE_CLASSES', DEFAULT_SIZE_CLASSES)]
+        self.max_value_size = max(slot_size for slot_size, _ in self.size_classes) - _SLOT_HEADER
+
+    @property
+    def table(self):
+        return _get_table(self.path, self.sets, self.size_classes)
+
+    def _locate(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=_DIGEST_SIZE).digest()
+        return digest, int.from_bytes(digest[:8], 'little') % self.sets
+
+    # ============================================
+    # READS
+    # ============================================
+
+    def _read(self, digest, index):
+        """(expiry, flags, value bytes) of the live entry for digest, or None"""
+        table = self.table
+        for _ in range(READ_RETRIES):
+            before = table.sequence(index)
+            if before % 2 == 0:
+                entry = self._copy(table, digest, index)
+                if table.sequence(index) == before:
+                    return entry
+            time.sleep(0)
+        # Writers kept the set busy; wait for them rather than spin
+        table.lock(index)
+        try:
+            return self._copy(table, digest, index)
+        finally:
+            table.unlock(index)
+
+    def _copy(self, table, digest, index):
+        way = table.find(index, digest)
+        if way is None:
+            return None
+        offset, slot_size = table.slot(index, way)
+        data = table.map
+        expires, _, length, crc, flags = _SLOT.unpack_from(data, offset)
+        if length > slot_size - _SLOT_HEADER:
+            return None  # Torn read; the caller's sequence check discards it
+        value = data[offset + _SLOT_HEADER:offset + _SLOT_HEADER + length]
+        if zlib.crc32(value) != crc or expires and expires <= time.time():
+            return None
+        # Racy on purpose: a lost update only blurs the LRU order
+        _USED.pack_into(data, offset + _USED_OFFSET, time.monotonic_ns())
+        return expires, flags, value
+
+    def _decode(self, entry):
+        _, flags, value = entry
+        if flags & _COMPRESSED:
+            value = zlib.decompress(value)
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        entry = self._read(*self._locate(key))
+        return default if entry is None else self._decode(entry)
+
+    # ============================================
+    # WRITES (the caller holds the set's lock)
+    # ============================================
+
+    def _encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= COMPRESS_MIN:
+            compressed = zlib.compress(data, 1)
+            if len(compressed) < len(data):
+                return compressed, _COMPRESSED
+        return data, 0
+
+    def _drop(self, table, digest, index):
+        way = table.find(index, digest)
+        if way is None:
+            return False
+        table.set_digest(index, way, _EMPTY)
+        return True
+
+    def _write(self, table, digest, index, expires, flags, data):
+        """Store an entry, evicting the set's least recently used one of its size class if full"""
+        self._drop(table, digest, index)
+        if len(data) > self.max_value_size:
+            return False
+        size_class = next(
+            c for c, (slot_size, _) in enumerate(self.size_classes) if len(data) <= slot_size - _SLOT_HEADER
+        )
+        now, target, oldest = time.time(), None, None
+        start = table.digest_offset(index)
+        for way, (way_class, _, _, _) in enumerate(table.way_slots):
+            if way_class != size_class:
+                continue
+            offset, _ = table.slot(index, way)
+            if table.map[start + way * _DIGEST_SIZE:start + (way + 1) * _DIGEST_SIZE] == _EMPTY:
+                target = way
+                break
+            slot_expires, used = _SLOT.unpack_from(table.map, offset)[:2]
+            if slot_expires and slot_expires <= now:
+                target = way
+                break
+            if oldest is None or used < oldest[1]:
+                oldest = (way, used)
+        way = target if target is not None else oldest[0]
+        offset, _ = table.slot(index, way)
+        table.map[offset + _SLOT_HEADER:offset + _SLOT_HEADER + len(data)] = data
+        _SLOT.pack_into(table.map, offset, expires or 0.0, time.monotonic_ns(), len(data), zlib.crc32(data), flags)
+        table.set_digest(index, way, digest)
+        return True
+
+    def _store(self, key, value, timeout, only_if_missing=False):
+        self.validate_key(key)
+        expires = self.get_backend_timeout(timeout)
+        digest, index = self._locate(key)
+        data, flags = self._encode(value)
+        table = self.table
+        table.lock(index)
+        try:
+            if only_if_missing and self._copy(table, digest, index) is not None:
+                return False
+            if expires is not None and expires <= time.time():
+                self._drop(table, digest, index)  # A timeout of 0 or less expires the key at once
+                return False
+            return self._write(table, digest, index, expires, flags, data)
+        finally:
+            table.unlock(index)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(self.make_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(self.make_key(key, version=version), value, timeout, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        digest, index = self._locate(key)
+        table = self.table
+        table.lock(index)
+        try:
+            entry = self._copy(table, digest, index)
+            if entry is None:
+                return False
+            _, flags, value = entry
+            return self._write(table, digest, index, self.get_backend_timeout(timeout), flags, value)
+        finally:
+            table.unlock(index)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        digest, index = self._locate(key)
+        table = self.table
+        table.lock(index)
+        try:
+            return self._drop(table, digest, index)
+        finally:
+            table.unlock(index)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        digest, index = self._locate(key)
+        table = self.table
+        table.lock(index)
+        try:
+            entry = self._copy(table, digest, index)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(entry) + delta
+            data, flags = self._encode(value)
+            self._write(table, digest, index, entry[0] or None, flags, data)
+            return value
+        finally:
+            table.unlock(index)
+
+    def clear(self):
+        table = self.table
+        size = table.ways * _DIGEST_SIZE
+        for index in range(self.sets):
+            start = table.digest_offset(index)
+            if table.map[start:start + size] == bytes(size):
+                continue  # Leave pages that were never written unallocated
+            table.lock(index)
+            try:
+                table.map[start:start + size] = bytes(size)
+            finally:
+                table.unlock(index)
+
+    def close(self, **kwargs):
+        # Django calls this after every request; the mapping stays open for the life of the process
+        pass
@@ -0,0 +1,148 @@
+"""
+Static file build and serving for auctionhub.
+
+collectstatic writes manifest-hashed copies of every asset plus .gz and
+(when the ``brotli`` package is installed) .br variants next to them.
+PrecompressedStaticMiddleware then serves STATIC_ROOT directly, picking the
+smallest variant the client accepts and marking hashed names immutable.
+"""
+
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.xml', '.html', '.map')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+def accepted_encodings(header):
+    """Codings an Accept-Encoding header allows; q=0 refuses one, * stands for any not named"""
+    weights = {}
+    for token in header.split(','):
+        coding, *params = [part.strip() for part in token.split(';')]
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    wildcard = weights.pop('*', 0.0)
+    return {
+        encoding for encoding, _ in ENCODINGS
+        if weights.get(encoding, wildcard) > 0
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes gzip/brotli variants of text assets"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            # Only keep variants that actually save bytes
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+class PrecompressedStaticMiddleware:
+    """Serve collected static files with precompressed variants and far-future caching"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.files = self.index(settings.STATIC_ROOT) if settings.STATIC_ROOT else {}
+
+    @staticmethod
+    def index(root):
+        """Map every collected URL name to its variants, stat'ing once at startup"""
+        root = str(root)
+        storage = CompressedManifestStaticFilesStorage(location=root)
+        immutable = set(storage.hashed_files.values())
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(suffixes) or filename == storage.manifest_name:
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                stat = os.stat(path)
+                variants = {None: path}
+                for encoding, suffix in ENCODINGS:
+                    if os.path.exists(path + suffix):
+                        variants[encoding] = path + suffix
+                content_type, _ = mimetypes.guess_type(filename)
+                files[name] = {
+                    'variants': variants,
+                    'content_type': content_type or 'application/octet-stream',
+                    'mtime': stat.st_mtime,
+                    'immutable': name in immutable,
+                }
+        return files
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            entry = self.files.get(request.path[len(self.prefix):])
+            if entry is not None:
+                return self.serve(request, entry)
+        return self.get_response(request)
+
+    def serve(self, request, entry):
+        if not entry['immutable'] and not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'), entry['mtime']
+        ):
+            return HttpResponseNotModified()
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next(
+            (encoding for encoding, _ in ENCODINGS if encoding in entry['variants'] and encoding in accepted),
+            None,
+        )
+        path = entry['variants'][encoding]
+        response = FileResponse(
+            open(path, 'rb'),
+            content_type=entry['content_type'],
+            filename=os.path.basename(entry['variants'][None]),
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if len(entry['variants']) > 1:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Last-Modified'] = http_date(entry['mtime'])
+        response.headers['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if entry['immutable'] else REVALIDATE_CACHE_CONTROL
+        )
+        return response
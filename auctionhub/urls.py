@@ -14,9 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from home.views import forbidden_view
+from .media import serve_media
+from .metrics import metrics_view
 
 
 handler403 = forbidden_view
@@ -26,5 +29,7 @@ urlpatterns = [
     path('', include('home.urls')),
     path('', include('auctions.urls')),
     path('', include('user_dashboard.urls')),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media, name='media'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
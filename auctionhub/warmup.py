@@ -0,0 +1,95 @@
+"""
+Worker warm-up for auctionhub.
+
+``warm_up()`` runs from the WSGI/ASGI entry points. It does the work a
+fresh worker would otherwise do on its first requests: importing every
+URLconf and view, building the URL resolver, compiling every template into
+the cached loader and opening (then closing) each database connection.
+Run by a pre-forking server (``gunicorn --preload``), it happens once in
+the master. ``gc.freeze()`` then moves everything loaded so far out of the
+collector's reach, so collections in the workers don't touch, and
+un-share, those copy-on-write pages.
+
+Warm-up is best-effort: a database that is down, or an ASGI server that
+imports the application inside its event loop (where the ORM refuses to
+run), only skips the database steps, which then happen on first use.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import time
+
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    started = time.perf_counter()
+    get_resolver().reverse_dict  # Imports every URLconf and view and builds the lookup tables
+    templates = compile_templates()
+    warm_up_databases()
+
+    gc.collect()
+    gc.freeze()
+    logger.info('Warmed up in %.2fs: %d templates compiled, %d objects frozen',
+                time.perf_counter() - started, templates, gc.get_freeze_count())
+
+
+def warm_up_databases():
+    """Open each connection and hydrate the order books, unless the database can't be used here"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        logger.info('Imported inside an event loop; database warm-up skipped')
+        return
+    try:
+        for alias in connections:
+            connections[alias].ensure_connection()
+    except (DatabaseError, SynchronousOnlyOperation):
+        logger.warning('Database unavailable during warm-up; connecting on first request', exc_info=True)
+        connections.close_all()
+        return
+
+    # Imported here: the order book pulls in the models, which needs a ready app registry
+    from auctions.orderbook import hydrate_on_startup
+    hydrate_on_startup()  # Also closes the connections, which must not be shared with forked workers
+
+
+def compile_templates():
+    """Compile every .html template into the cached loader; returns how many were compiled"""
+    compiled = 0
+    for engine in engines.all():
+        for directory in template_dirs(engine):
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if not filename.endswith('.html'):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+                    try:
+                        engine.get_template(name)
+                    except TemplateSyntaxError:
+                        # Broken templates still fail on the request that renders them, as before
+                        logger.warning('Template %s failed to compile during warm-up', name, exc_info=True)
+                        continue
+                    compiled += 1
+    return compiled
+
+
+def template_dirs(engine):
+    loaders = list(engine.engine.template_loaders)
+    dirs = []
+    while loaders:
+        loader = loaders.pop(0)
+        loaders.extend(getattr(loader, 'loaders', []))  # The cached loader wraps the real ones
+        if hasattr(loader, 'get_dirs'):
+            dirs.extend(str(directory) for directory in loader.get_dirs())
+    return dict.fromkeys(dirs)
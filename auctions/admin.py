@@ -1,3 +1,277 @@
-from django.contrib import admin
+# SMASH Marketplace - Admin
+# Scrap Metal Auction Sales Hub
+# File: auctions/admin.py
 
-# Register your models here.
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from .cache import invalidate, product_detail_key, sale_detail_key, sale_leaderboard_key
+from .models import (
+    AppraisalFormula, ArchivedBid, ArchivedProduct, ArchivedSale, Bid, BidIncrement, Category,
+    CategoryBidLimit, MetalPrice, Package, Product, Sale, Task,
+)
+from .pricing import current_prices, missing_metals, reprice_inventory
+
+
+# ============================================
+# LARGE TABLES
+# ============================================
+
+class EstimatedCountPaginator(Paginator):
+    """Never counts more than ADMIN_COUNT_LIMIT rows
+
+    An unfiltered PostgreSQL changelist reads the planner's row estimate;
+    anything else counts at most ADMIN_COUNT_LIMIT rows, so paging past that
+    point needs a filter or a search.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = _estimated_rows(queryset)
+            if estimate is not None and estimate > settings.ADMIN_COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+
+
+def _estimated_rows(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows
+
+    No exact COUNTs (the paginator caps them and the unfiltered total is not
+    shown), no per-filter facet counts, foreign keys joined into the page
+    query and ordered by the primary key index.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 50
+    ordering = ['-pk']
+
+    def get_actions(self, request):
+        # The stock delete action loads and lists every related row before confirming
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+def in_batches(queryset, batch_size=None):
+    """Primary keys of queryset in ascending batches, read one batch at a time"""
+    batch_size = batch_size or settings.ADMIN_ACTION_BATCH_SIZE
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+# ============================================
+# CATALOG
+# ============================================
+
+# Sellers and bidders are picked by autocomplete; the stock search runs icontains on four columns
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class MarketplaceUserAdmin(UserAdmin):
+    search_fields = ['username__startswith', 'email__exact']
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    search_fields = ['name']
+
+
+@admin.register(Package)
+class PackageAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'unit_count', 'total_weight', 'final_weight', 'created_at']
+    list_filter = ['status']
+    search_fields = ['name__startswith']
+    readonly_fields = ['unit_count', 'total_weight']
+
+
+@admin.register(Sale)
+class SaleAdmin(admin.ModelAdmin):
+    list_display = ['lot_number', 'title', 'status', 'unit_count', 'total_weight', 'bid_due_date']
+    list_filter = ['status', 'seller_type']
+    search_fields = ['lot_number__exact', 'title__startswith']
+    autocomplete_fields = ['packages']
+    readonly_fields = ['unit_count', 'total_weight', 'latitude', 'longitude']
+    actions = ['close_sales']
+
+    @admin.action(description='Close bidding on selected active sales')
+    def close_sales(self, request, queryset):
+        closed = deactivated = 0
+        for pks in in_batches(queryset.filter(status='ACTIVE')):
+            with transaction.atomic():
+                closed += Sale.objects.filter(pk__in=pks, status='ACTIVE').update(status='CLOSED')
+                # Bids are taken per unit, so the units stop accepting them; units whose
+                # package is still listed in another active sale stay open
+                units = (
+                    Product.objects.filter(package__sales__in=pks, is_active=True)
+                    .exclude(package__sales__status='ACTIVE').values_list('pk', flat=True).distinct()
+                )
+                unit_pks = list(units)
+                size = settings.ADMIN_ACTION_BATCH_SIZE
+                for start in range(0, len(unit_pks), size):
+                    # The version bump makes cached fragments and order books reload
+                    deactivated += Product.objects.filter(pk__in=unit_pks[start:start + size]).update(
+                        is_active=False, version=F('version') + 1
+                    )
+            invalidate(*(key for pk in pks for key in (sale_detail_key(pk), sale_leaderboard_key(pk))))
+            invalidate(*(product_detail_key(pk) for pk in unit_pks))
+        self.message_user(request, f'Closed {closed} sales and deactivated {deactivated} units.', messages.SUCCESS)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = [
+        'unique_unit_id', 'title', 'seller', 'package', 'appraisal_category', 'appraisal_value',
+        'current_item_bid', 'is_active',
+    ]
+    list_select_related = ['seller', 'package']
+    list_filter = ['is_active', 'appraisal_category', 'fullness']
+    # Case-sensitive prefix match, which the unique index can serve; matching on title would scan
+    search_fields = ['unique_unit_id__startswith']
+    search_help_text = 'Unit ID, or the start of one'
+    autocomplete_fields = ['seller', 'category', 'package']
+    readonly_fields = [
+        'current_bid', 'current_item_bid', 'suggested_starting_price', 'watcher_count', 'version', 'client_id',
+    ]
+    actions = ['deactivate_units', 'reprice_units']
+
+    @admin.action(description='Deactivate selected units')
+    def deactivate_units(self, request, queryset):
+        deactivated = 0
+        for pks in in_batches(queryset.filter(is_active=True)):
+            with transaction.atomic():
+                # The version bump makes cached fragments and order books reload
+                deactivated += Product.objects.filter(pk__in=pks, is_active=True).update(
+                    is_active=False, version=F('version') + 1
+                )
+            invalidate(*(product_detail_key(pk) for pk in pks))
+        self.message_user(request, f'Deactivated {deactivated} units.', messages.SUCCESS)
+
+    @admin.action(description='Reprice selected units from current metal prices')
+    def reprice_units(self, request, queryset):
+        missing = missing_metals(current_prices())
+        if missing:
+            self.message_user(
+                request, f"Nothing repriced: there is no price yet for {', '.join(missing)}.", messages.ERROR
+            )
+            return
+        checked = changed = 0
+        for checked, changed, total in reprice_inventory(
+            batch_size=settings.ADMIN_ACTION_BATCH_SIZE, pause=0, units=queryset.select_related(None)
+        ):
+            pass
+        self.message_user(request, f'Repriced {changed} of {checked} active units.', messages.SUCCESS)
+
+
+@admin.register(Bid)
+class BidAdmin(LargeTableAdmin):
+    list_display = ['pk', 'product', 'user', 'amount', 'appraisal_category', 'created_at']
+    list_select_related = ['product', 'user']
+    search_fields = ['product__unique_unit_id__exact', 'user__username__exact']
+    search_help_text = 'Exact unit ID or bidder username'
+    autocomplete_fields = ['product', 'user', 'package']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Resolve the unit and bidder through their unique indexes first; an OR across
+        # the two joins would otherwise walk the bids table
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        product_ids = list(Product.objects.filter(unique_unit_id=term).values_list('pk', flat=True))
+        user_ids = list(User.objects.filter(username=term).values_list('pk', flat=True))
+        return queryset.filter(Q(product_id__in=product_ids) | Q(user_id__in=user_ids)), False
+
+
+# ============================================
+# PRICING AND RULES
+# ============================================
+
+@admin.register(MetalPrice)
+class MetalPriceAdmin(admin.ModelAdmin):
+    list_display = ['metal', 'as_of', 'price_per_ozt']
+    list_filter = ['metal']
+    date_hierarchy = 'as_of'
+
+
+@admin.register(AppraisalFormula)
+class AppraisalFormulaAdmin(admin.ModelAdmin):
+    list_display = [
+        'appraisal_category', 'pt_grams_per_lb', 'pd_grams_per_lb', 'rh_grams_per_lb', 'payable',
+        'typical_weight_lbs', 'starting_price_ratio',
+    ]
+
+
+@admin.register(BidIncrement)
+class BidIncrementAdmin(admin.ModelAdmin):
+    list_display = ['category', 'from_amount', 'increment']
+    list_filter = ['category']
+
+
+@admin.register(CategoryBidLimit)
+class CategoryBidLimitAdmin(admin.ModelAdmin):
+    list_display = ['category', 'min_bid', 'max_bid', 'max_raise']
+
+
+# ============================================
+# OPERATIONS AND ARCHIVE (read-only)
+# ============================================
+
+class ReadOnlyAdmin(LargeTableAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Task)
+class TaskAdmin(ReadOnlyAdmin):
+    list_display = ['pk', 'name', 'status', 'priority', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['name__exact']
+
+
+@admin.register(ArchivedSale)
+class ArchivedSaleAdmin(ReadOnlyAdmin):
+    list_display = ['lot_number', 'title', 'status', 'unit_count', 'total_weight', 'bid_due_date']
+    search_fields = ['lot_number__exact']
+
+
+@admin.register(ArchivedProduct)
+class ArchivedProductAdmin(ReadOnlyAdmin):
+    list_display = ['unique_unit_id', 'title', 'sale', 'package_name', 'current_item_bid']
+    list_select_related = ['sale']
+    search_fields = ['unique_unit_id__exact']
+
+
+@admin.register(ArchivedBid)
+class ArchivedBidAdmin(ReadOnlyAdmin):
+    list_display = ['original_id', 'product', 'user', 'amount', 'created_at']
+    list_select_related = ['product', 'user']
+    search_fields = ['product__unique_unit_id__exact', 'user__username__exact']
@@ -4,9 +4,18 @@
 # REPLACE your existing apps.py with this complete file
 
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class AuctionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auctions'
     verbose_name = 'SMASH Marketplace - Catalytic Converter Auctions'
+
+    def ready(self):
+        # Register every app's background tasks so workers can find them by name
+        autodiscover_modules('tasks')
+        # Keep package and sale unit counts current as units are saved and deleted
+        from . import inventory  # noqa: F401
+        # and the unit ID trigram index current as unit IDs are assigned
+        from . import unitsearch  # noqa: F401
@@ -0,0 +1,184 @@
+# SMASH Marketplace - Sale Archival
+# Scrap Metal Auction Sales Hub
+# File: auctions/archive.py
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, F, Sum, Value
+from django.utils import timezone
+
+from .cache import invalidate, product_detail_key, sale_detail_key, sale_leaderboard_key
+from .models import (
+    ArchivedBid, ArchivedProduct, ArchivedProductImage, ArchivedSale, Bid, Package, Product, Sale,
+)
+
+
+ARCHIVABLE_STATUS = 'SETTLED'
+
+
+def archivable_sales(older_than_days):
+    """Settled sales whose bidding closed more than older_than_days ago
+
+    A package can be listed in more than one sale, so a sale only qualifies
+    once every sale sharing one of its packages qualifies too; otherwise its
+    units would vanish from a sale that is still live.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    still_live = Sale.objects.exclude(status=ARCHIVABLE_STATUS, bid_due_date__lt=cutoff)
+    return (
+        Sale.objects.filter(status=ARCHIVABLE_STATUS, bid_due_date__lt=cutoff)
+        .exclude(packages__sales__in=still_live)
+        .order_by('bid_due_date', 'pk')
+    )
+
+
+def archive_sales(older_than_days, batch_size=50, bid_batch_size=1000):
+    """Move qualifying sales, their units and bids to the archive tables
+
+    Each batch of sales is copied and deleted in its own transaction, so a
+    run can be interrupted at any point and simply started again. Yields
+    (sales, products, bids) counts per batch.
+    """
+    while True:
+        with transaction.atomic():
+            sales = list(archivable_sales(older_than_days).prefetch_related('packages')[:batch_size])
+            if not sales:
+                return
+            yield _archive_batch(sales, bid_batch_size)
+
+
+def _archive_batch(sales, bid_batch_size):
+    sale_for_package = {}
+    for sale in sales:
+        for package in sale.packages.all():
+            # A package shared by two archived sales is filed under the later one
+            sale_for_package[package.pk] = sale
+
+    ArchivedSale.objects.bulk_create([
+        ArchivedSale(
+            original_id=sale.pk, lot_number=sale.lot_number, title=sale.title,
+            description=sale.description, zip_code=sale.zip_code, unit_count=sale.unit_count,
+            total_weight=sale.total_weight, seller_type=sale.seller_type,
+            bid_due_date=sale.bid_due_date, status=sale.status, created_at=sale.created_at,
+        )
+        for sale in sales
+    ])
+    archived_sale_ids = dict(
+        ArchivedSale.objects.filter(original_id__in=[s.pk for s in sales]).values_list('original_id', 'pk')
+    )
+
+    products = list(
+        Product.objects.filter(package_id__in=sale_for_package)
+        .select_subclasses()
+        .select_related('package')
+        .prefetch_related('images')
+    )
+    ArchivedProduct.objects.bulk_create([
+        ArchivedProduct(
+            original_id=product.pk,
+            sale_id=archived_sale_ids[sale_for_package[product.package_id].pk],
+            package_name=product.package.name,
+            unique_unit_id=product.unique_unit_id, title=product.title, description=product.description,
+            seller_id=product.seller_id, category_id=product.category_id, fullness=product.fullness,
+            appraisal_category=product.appraisal_category, appraisal_value=product.appraisal_value,
+            starting_bid=product.starting_bid, starting_price=product.starting_price,
+            current_bid=product.current_bid, current_item_bid=product.current_item_bid,
+            details=_subclass_details(product), created_at=product.created_at, end_time=product.end_time,
+        )
+        for product in products
+    ])
+    product_ids = [p.pk for p in products]
+    archived_product_ids = dict(
+        ArchivedProduct.objects.filter(original_id__in=product_ids).values_list('original_id', 'pk')
+    )
+    ArchivedProductImage.objects.bulk_create([
+        ArchivedProductImage(product_id=archived_product_ids[product.pk], image=image.image.name)
+        for product in products
+        for image in product.images.all()
+    ])
+
+    bid_count = 0
+    bids = []
+    for bid in Bid.objects.filter(product_id__in=product_ids).order_by().iterator(chunk_size=bid_batch_size):
+        bids.append(ArchivedBid(
+            original_id=bid.pk, product_id=archived_product_ids[bid.product_id], user_id=bid.user_id,
+            amount=bid.amount, appraisal_category=bid.appraisal_category,
+            appraisal_value=bid.appraisal_value, fullness_applied=bid.fullness_applied,
+            created_at=bid.created_at,
+        ))
+        if len(bids) >= bid_batch_size:
+            bid_count += len(ArchivedBid.objects.bulk_create(bids))
+            bids = []
+    bid_count += len(ArchivedBid.objects.bulk_create(bids))
+
+    # Cascades take the bids, images, favorites and legacy subclass rows with them
+    Product.objects.filter(pk__in=product_ids).delete()
+    Sale.objects.filter(pk__in=[s.pk for s in sales]).delete()
+    Package.objects.filter(pk__in=sale_for_package, sales__isnull=True).delete()
+
+    keys = [product_detail_key(pk) for pk in product_ids]
+    for sale in sales:
+        keys += [sale_detail_key(sale.pk), sale_leaderboard_key(sale.pk)]
+    transaction.on_commit(lambda: invalidate(*keys))
+    return len(sales), len(products), bid_count
+
+
+def _subclass_details(product):
+    """Field values that live on a legacy Product subclass table, e.g. Art or Book"""
+    model = type(product)
+    if model is Product:
+        return {}
+    details = {'type': model._meta.model_name}
+    for field in model._meta.local_concrete_fields:
+        if not (field.remote_field and field.remote_field.parent_link):
+            details[field.attname] = getattr(product, field.attname)
+    return details
+
+
+# ============================================
+# READS ACROSS LIVE AND ARCHIVED ROWS
+# ============================================
+
+def bid_history(user):
+    """A user's bids, newest first, whether or not their sale has been archived
+
+    Archived bids and products expose the same attributes the templates use,
+    plus is_archived so links to live pages can be skipped.
+    """
+    live = Bid.objects.filter(user=user).select_related('product')
+    archived = ArchivedBid.objects.filter(user=user).select_related('product')
+    return sorted([*live, *archived], key=lambda bid: bid.created_at, reverse=True)
+
+
+def settlement_history(user):
+    """Units won and amount owed per settled sale, live and archived, in one query
+
+    A unit is won when the user's bid equals its current item bid, the same
+    rule the sale leaderboard uses.
+    """
+    live = (
+        Bid.objects.filter(
+            user=user,
+            product__package__sales__status='SETTLED',
+            amount=F('product__current_item_bid'),
+        )
+        .values(
+            lot_number=F('product__package__sales__lot_number'),
+            title=F('product__package__sales__title'),
+            closed_at=F('product__package__sales__bid_due_date'),
+        )
+        .annotate(units_won=Count('pk'), total=Sum('amount'), archived=Value(False, BooleanField()))
+        .order_by()
+    )
+    archived = (
+        ArchivedBid.objects.filter(user=user, amount=F('product__current_item_bid'))
+        .values(
+            lot_number=F('product__sale__lot_number'),
+            title=F('product__sale__title'),
+            closed_at=F('product__sale__bid_due_date'),
+        )
+        .annotate(units_won=Count('pk'), total=Sum('amount'), archived=Value(True, BooleanField()))
+        .order_by()
+    )
+    return live.union(archived, all=True).order_by('-closed_at')
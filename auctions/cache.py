@@ -0,0 +1,144 @@
+# SMASH Marketplace - Hot Page Cache
+# Scrap Metal Auction Sales Hub
+# File: auctions/cache.py
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Sale
+
+
+_MISSING = object()
+
+
+def product_detail_key(pk):
+    return f'auctions:product_detail:{pk}'
+
+
+def sale_detail_key(pk):
+    return f'auctions:sale_detail:{pk}'
+
+
+def sale_leaderboard_key(pk):
+    return f'auctions:sale_leaderboard:{pk}'
+
+
+# ============================================
+# SINGLE-FLIGHT FILL
+# ============================================
+
+class _Flight:
+    """One in-flight computation that concurrent misses wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.stale = False
+
+
+class _AsyncFlight:
+    """Async counterpart of _Flight, bound to the running event loop"""
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.stale = False
+
+
+_flights = {}
+_async_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_or_compute(key, compute, timeout=None):
+    """Return the cached value for key, letting only one caller per process compute a miss"""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = compute()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+            # A bid landed while computing: hand the value to the waiters but don't cache it
+            if flight.error is None and not flight.stale:
+                cache.set(key, flight.value, timeout or settings.HOT_PAGE_CACHE_TIMEOUT)
+        flight.done.set()
+    return flight.value
+
+
+async def aget_or_compute(key, compute, timeout=None):
+    """Async version of get_or_compute; compute is a coroutine function"""
+    value = await cache.aget(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    flight = _async_flights.get(key)
+    if flight is not None:
+        return await asyncio.shield(flight.future)
+
+    flight = _async_flights[key] = _AsyncFlight()
+    try:
+        value = await compute()
+    except asyncio.CancelledError:
+        flight.future.cancel()
+        raise
+    except Exception as e:
+        flight.future.set_exception(e)
+        # Waiters re-raise it; mark it retrieved so the loop doesn't warn
+        flight.future.exception()
+        raise
+    finally:
+        del _async_flights[key]
+    if not flight.stale:
+        await cache.aset(key, value, timeout or settings.HOT_PAGE_CACHE_TIMEOUT)
+    flight.future.set_result(value)
+    return value
+
+
+# ============================================
+# INVALIDATION
+# ============================================
+
+def invalidate(*keys):
+    """Drop cached pages and keep in-flight fills from caching what they read"""
+    with _flights_lock:
+        for key in keys:
+            for flights in (_flights, _async_flights):
+                if key in flights:
+                    flights[key].stale = True
+    cache.delete_many(keys)
+
+
+def invalidate_product(product, sale_ids=None):
+    """Drop the product page and the pages and leaderboards of every sale its package is in
+
+    Callers that already know those sales (an order book does) pass sale_ids
+    to save the lookup.
+    """
+    keys = [product_detail_key(product.pk)]
+    if sale_ids is None and product.package_id:
+        sale_ids = Sale.objects.filter(packages__id=product.package_id).values_list('pk', flat=True)
+    if sale_ids:
+        for pk in sale_ids:
+            keys += [sale_detail_key(pk), sale_leaderboard_key(pk)]
+    invalidate(*keys)
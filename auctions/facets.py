@@ -0,0 +1,123 @@
+# SMASH Marketplace - Product Facets
+# Scrap Metal Auction Sales Hub
+# File: auctions/facets.py
+
+import hashlib
+from collections import Counter
+
+from django.db.models import Case, CharField, Count, Value, When
+
+from .models import Product
+
+
+FACETS = ('category', 'package', 'appraisal_category', 'fullness', 'price_bucket')
+FACET_PARAMS = FACETS + ('min_price', 'max_price', 'search')
+# Matched case-insensitively by the product list, so their case must not split the cache
+CASELESS_PARAMS = ('category', 'search')
+
+# Column each facet is counted on
+FACET_COLUMNS = {
+    'category': 'category_id',
+    'package': 'package_id',
+    'appraisal_category': 'appraisal_category',
+    'fullness': 'fullness',
+    'price_bucket': 'price_bucket',
+}
+
+# (key, label, lower bound, upper bound) on current_item_bid
+PRICE_BUCKETS = [
+    ('0-100', 'Under $100', None, 100),
+    ('100-250', '$100 - $250', 100, 250),
+    ('250-500', '$250 - $500', 250, 500),
+    ('500-1000', '$500 - $1,000', 500, 1000),
+    ('1000+', '$1,000 and up', 1000, None),
+]
+NO_BIDS_BUCKET = 'none'
+
+
+def price_bucket_expression():
+    whens = [When(current_item_bid__isnull=True, then=Value(NO_BIDS_BUCKET))]
+    for key, _, low, high in PRICE_BUCKETS:
+        if high is not None:
+            whens.append(When(current_item_bid__lt=high, then=Value(key)))
+        else:
+            whens.append(When(current_item_bid__gte=low, then=Value(key)))
+    return Case(*whens, output_field=CharField())
+
+
+def filter_price_bucket(queryset, key):
+    for bucket_key, _, low, high in PRICE_BUCKETS:
+        if bucket_key == key:
+            if low is not None:
+                queryset = queryset.filter(current_item_bid__gte=low)
+            if high is not None:
+                queryset = queryset.filter(current_item_bid__lt=high)
+            return queryset
+    if key == NO_BIDS_BUCKET:
+        return queryset.filter(current_item_bid__isnull=True)
+    return queryset
+
+
+def facet_cache_key(params):
+    """Cache key for a filter state; order and blank values don't matter, nor case where matching ignores it"""
+    normalized = sorted(
+        (name, value.lower() if name in CASELESS_PARAMS else value)
+        for name, value in ((name, params.get(name, '').strip()) for name in FACET_PARAMS)
+        if value
+    )
+    digest = hashlib.md5(repr(normalized).encode(), usedforsecurity=False).hexdigest()
+    return f'auctions:facets:{digest}'
+
+
+def facet_counts(queryset, unfiltered=None):
+    """Counts per category, package, appraisal category, fullness and price bucket
+
+    unfiltered maps each facet with an option selected to the queryset with
+    every filter but that facet's own, so its other options keep counting
+    what selecting them instead would show. Those facets get one small
+    GROUP BY each; the rest come from a single GROUP BY over their combined
+    values on queryset, rolled up in Python. The number of groups is bounded
+    by the option counts, not by the number of products.
+    """
+    unfiltered = unfiltered or {}
+    counts = _group_counts(queryset, [facet for facet in FACETS if facet not in unfiltered])
+    for facet, facet_queryset in unfiltered.items():
+        counts.update(_group_counts(facet_queryset, [facet]))
+    return counts
+
+
+def _group_counts(queryset, facets):
+    if not facets:
+        return {}
+    queryset = queryset.order_by()
+    if 'price_bucket' in facets:
+        queryset = queryset.annotate(price_bucket=price_bucket_expression())
+    rows = queryset.values(*(FACET_COLUMNS[facet] for facet in facets)).annotate(count=Count('pk'))
+    counts = {facet: Counter() for facet in facets}
+    for row in rows:
+        for facet in facets:
+            counts[facet][row[FACET_COLUMNS[facet]]] += row['count']
+    return {facet: dict(counter) for facet, counter in counts.items()}
+
+
+def facet_options(counts, categories, packages):
+    """Label the raw counts for the filter sidebar"""
+    def options(pairs, facet):
+        return [
+            {'value': value, 'label': label, 'count': counts[facet].get(key, 0)}
+            for key, value, label in pairs
+        ]
+
+    return {
+        'category': options([(c.pk, c.name, c.name) for c in categories], 'category'),
+        'package': options([(p.pk, p.pk, p.name) for p in packages], 'package'),
+        'appraisal_category': options(
+            [(key, key, label) for key, label in Product.APPRAISAL_CATEGORY_CHOICES], 'appraisal_category'
+        ),
+        'fullness': options([(key, key, label) for key, label in Product.FULLNESS_CHOICES], 'fullness'),
+        'price_bucket': options(
+            [(key, key, label) for key, label, _, _ in PRICE_BUCKETS]
+            + [(NO_BIDS_BUCKET, NO_BIDS_BUCKET, 'No bids yet')],
+            'price_bucket',
+        ),
+    }
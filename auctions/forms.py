@@ -4,16 +4,35 @@
 # REPLACE your existing forms.py with this complete file
 
 from django import forms
+from django.conf import settings
+from django.core.validators import validate_image_file_extension
 from .models import Product, Bid, Category, Package, Sale
 
 
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """A file field that accepts several files and cleans to a list"""
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput)
+        super().__init__(*args, **kwargs)
+    
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleFileField, self).clean(file, initial) for file in data]
+        return [super().clean(data, initial)] if data else []
+
+
 class ProductForm(forms.ModelForm):
     """Form for creating/editing catalytic converters"""
     
-    image = forms.FileField(
-        widget=forms.ClearableFileInput, 
+    images = MultipleFileField(
         required=False,
-        help_text="Upload photo of the catalytic converter"
+        validators=[validate_image_file_extension],
+        help_text="Upload photos of the catalytic converter (several angles welcome)"
     )
     
     class Meta:
@@ -24,11 +43,13 @@ class ProductForm(forms.ModelForm):
             'description', 
             'category',
             'package',
+            'weight',
             'fullness',
             'appraisal_category',
             'appraisal_value',
             'starting_price',
-            'image'
+            'reserve_price',
+            'images'
         ]
         widgets = {
             'description': forms.Textarea(attrs={
@@ -48,19 +69,34 @@ class ProductForm(forms.ModelForm):
                 'min': '0',
                 'placeholder': '0.00'
             }),
+            'weight': forms.NumberInput(attrs={
+                'step': '0.01',
+                'min': '0',
+                'placeholder': '0.00'
+            }),
+            'reserve_price': forms.NumberInput(attrs={
+                'step': '0.01',
+                'min': '0',
+                'placeholder': 'Optional'
+            }),
         }
         labels = {
             'unique_unit_id': 'Unit ID',
             'starting_price': 'Starting Price ($)',
+            'reserve_price': 'Reserve Price ($, hidden from bidders)',
             'appraisal_value': 'Appraisal Value ($/lb)',
+            'weight': 'Weight (lbs)',
         }
     
-    def clean_image(self):
-        """Validate image upload"""
-        image = self.cleaned_data.get('image')
-        if self.instance.pk and self.instance.additional_images.exists() and image:
-            raise forms.ValidationError("Maximum images reached for this product.")
-        return image
+    def clean_images(self):
+        """Validate image uploads"""
+        images = self.cleaned_data.get('images') or []
+        existing = self.instance.images.count() if self.instance.pk else 0
+        if images and existing + len(images) > settings.MAX_PRODUCT_IMAGES:
+            raise forms.ValidationError(
+                f"A product can have at most {settings.MAX_PRODUCT_IMAGES} images ({existing} already uploaded)."
+            )
+        return images
 
 
 class BidForm(forms.ModelForm):
@@ -135,8 +171,6 @@ class SaleForm(forms.ModelForm):
             'description',
             'packages',
             'zip_code',
-            'unit_count',
-            'total_weight',
             'seller_type',
             'bid_due_date',
             'pickup_instructions',
@@ -156,14 +190,6 @@ class SaleForm(forms.ModelForm):
             'zip_code': forms.TextInput(attrs={
                 'placeholder': 'e.g., P7A1A1'
             }),
-            'unit_count': forms.NumberInput(attrs={
-                'min': '0'
-            }),
-            'total_weight': forms.NumberInput(attrs={
-                'step': '0.01',
-                'min': '0',
-                'placeholder': '0.00'
-            }),
             'bid_due_date': forms.DateTimeInput(attrs={
                 'type': 'datetime-local'
             }),
@@ -175,8 +201,6 @@ class SaleForm(forms.ModelForm):
         }
         labels = {
             'lot_number': 'LOT Number',
-            'unit_count': 'Total Number of Converters',
-            'total_weight': 'Total Weight (lbs)',
             'bid_due_date': 'Bidding Deadline',
         }
 
@@ -0,0 +1,64 @@
+# SMASH Marketplace - Radius Search
+# Scrap Metal Auction Sales Hub
+# File: auctions/geo.py
+
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.045
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the circle; longitude is None near the poles"""
+    dlat = radius_km / KM_PER_DEGREE_LATITUDE
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6:
+        return min_lat, max_lat, None, None
+    dlon = radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat)
+    if dlon >= 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, longitude - dlon, longitude + dlon
+
+
+def distance_expression(latitude, longitude):
+    """Haversine distance in km from a point to each row's latitude/longitude"""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    a = (
+        Power(Sin((Radians(F('latitude')) - Value(lat)) / Value(2.0)), 2)
+        + Cos(Radians(F('latitude'))) * Value(math.cos(lat))
+        * Power(Sin((Radians(F('longitude')) - Value(lon)) / Value(2.0)), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Rows within radius_km, annotated with distance_km and nearest first
+
+    The indexed latitude/longitude range filter narrows the candidates before
+    the exact haversine distance is computed for what is left.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat))
+    # Near the poles or across the antimeridian only the latitude band is used
+    if min_lon is not None and min_lon >= -180 and max_lon <= 180:
+        queryset = queryset.filter(longitude__range=(min_lon, max_lon))
+    return (
+        queryset.annotate(distance_km=distance_expression(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+        .order_by('distance_km')
+    )
@@ -0,0 +1,57 @@
+# SMASH Marketplace - Hot Path Metrics
+# Scrap Metal Auction Sales Hub
+# File: auctions/instrumentation.py
+
+import time
+
+from auctionhub.db import request_queries
+from auctionhub.metrics import Counter, Histogram, collector
+
+from .queue import queue_stats
+
+
+BIDS = Counter('auctionhub_bids_total', 'Bids submitted, by outcome (accepted, rejected, busy, error)')
+BID_SECONDS = Histogram('auctionhub_bid_seconds', 'Time to judge and record a bid')
+VIEW_SECONDS = Histogram('auctionhub_view_seconds', 'Time to build and render a page, by view')
+VIEW_QUERIES = Histogram('auctionhub_view_queries', 'Database queries per page view, by view',
+                         buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+
+
+class InstrumentedViewMixin:
+    """Record each request's latency and query count under metrics_name
+
+    Template responses are measured once rendered, since most of a list
+    page's queries run while its template is.
+    """
+    metrics_name = None
+
+    def dispatch(self, request, *args, **kwargs):
+        started, queries = time.perf_counter(), request_queries()
+        if self.view_is_async:
+            return self._dispatch_async(request, started, queries, *args, **kwargs)
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            response.add_post_render_callback(lambda rendered: self._observe(started, queries))
+        else:
+            self._observe(started, queries)
+        return response
+
+    async def _dispatch_async(self, request, started, queries, *args, **kwargs):
+        response = await super().dispatch(request, *args, **kwargs)
+        self._observe(started, queries)
+        return response
+
+    def _observe(self, started, queries_before):
+        VIEW_SECONDS.observe(time.perf_counter() - started, view=self.metrics_name)
+        queries = request_queries()
+        if queries is not None and queries_before is not None:
+            VIEW_QUERIES.observe(queries - queries_before, view=self.metrics_name)
+
+
+@collector
+def task_queue_depth():
+    rows = queue_stats()
+    return [(
+        'auctionhub_task_queue_depth', 'gauge', 'Background tasks waiting or running, by task and state',
+        [({'task': row['name'], 'state': state}, row[state]) for row in rows for state in ('ready', 'delayed', 'running')],
+    )]
@@ -0,0 +1,215 @@
+# SMASH Marketplace - Offline Intake Sync
+# Scrap Metal Auction Sales Hub
+# File: auctions/intake.py
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from .cache import invalidate, product_detail_key, sale_detail_key, sale_leaderboard_key
+from .inventory import adjust_package
+from .models import Bid, Category, Package, Product, Sale
+from .orderbook import order_books
+from .unitsearch import index_units
+
+
+# What a tablet may send for a unit, as in ProductForm, plus the listing fields it
+# has no form for; category and package are primary keys
+FIELDS = [
+    'unique_unit_id', 'title', 'description', 'category', 'package', 'weight', 'fullness',
+    'appraisal_category', 'appraisal_value', 'starting_price', 'reserve_price', 'starting_bid', 'end_time',
+]
+
+CREATED, UPDATED, UNCHANGED = 'created', 'updated', 'unchanged'
+INVALID, DUPLICATE, CONFLICT, FORBIDDEN, LOCKED = 'invalid', 'duplicate', 'conflict', 'forbidden', 'locked'
+
+
+def _fields():
+    return {name: Product._meta.get_field(name) for name in FIELDS}
+
+
+def _parse_client_id(record):
+    try:
+        return Product._meta.get_field('client_id').to_python(record.get('client_id'))
+    except ValidationError:
+        return None
+
+
+def _clean(record, fields, categories, packages):
+    """Model-level cleaning of one record -> ({attname: value} for the fields it sent, errors)"""
+    values, errors = {}, {}
+    for name, field in fields.items():
+        if name not in record:
+            continue
+        raw = record[name]
+        if isinstance(field, models.ForeignKey):
+            known = categories if name == 'category' else packages
+            if raw in (None, '') and field.null:
+                values[field.attname] = None
+            elif isinstance(raw, int) and raw in known:
+                values[field.attname] = raw
+            else:
+                errors[name] = [f'Unknown {name}.']
+            continue
+        if raw == '' and field.null:
+            raw = None  # Blank unit IDs must not collide on the unique index
+        try:
+            value = field.clean(raw, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+            continue
+        if isinstance(value, datetime) and settings.USE_TZ and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        values[field.attname] = value
+    return values, errors
+
+
+def sync_products(seller, records):
+    """Create or update the seller's units from tablet records, keyed on their client_id
+
+    Every record is answered with a status, in order: created, updated,
+    unchanged (a replay), or one of invalid, duplicate (the client_id comes
+    again later in the batch, which wins), conflict (the unit ID belongs to
+    another record), forbidden (another seller's unit) or locked (the unit
+    has bids). Accepted records are written by one bulk upsert in a single
+    transaction; package counts, the unit ID index and cached pages follow.
+    """
+    fields = _fields()
+    results = [{'client_id': record.get('client_id') if isinstance(record, dict) else None} for record in records]
+    client_ids = [_parse_client_id(record) if isinstance(record, dict) else None for record in records]
+    last = {client_id: i for i, client_id in enumerate(client_ids) if client_id is not None}
+    for i, client_id in enumerate(client_ids):
+        if client_id is None:
+            results[i].update(status=INVALID, errors={'client_id': ['A UUID is required.']})
+        elif last[client_id] != i:
+            results[i]['status'] = DUPLICATE
+
+    pending = {client_id: i for client_id, i in last.items() if 'status' not in results[i]}
+    category_ids = {records[i].get('category') for i in pending.values()}
+    package_ids = {records[i].get('package') for i in pending.values()}
+    categories = set(Category.objects.filter(pk__in=[pk for pk in category_ids if isinstance(pk, int)])
+                     .values_list('pk', flat=True))
+    packages = set(Package.objects.filter(pk__in=[pk for pk in package_ids if isinstance(pk, int)])
+                   .values_list('pk', flat=True))
+
+    cleaned = {}
+    for client_id, i in pending.items():
+        values, errors = _clean(records[i], fields, categories, packages)
+        if errors:
+            results[i].update(status=INVALID, errors=errors)
+        else:
+            cleaned[client_id] = values
+
+    with transaction.atomic():
+        attnames = [field.attname for field in fields.values()]
+        existing = {
+            row['client_id']: row for row in Product.objects.select_for_update()
+            .filter(client_id__in=cleaned).values('pk', 'client_id', 'seller_id', 'version', *attnames)
+        }
+        with_bids = set(
+            Bid.objects.filter(product__in=[row['pk'] for row in existing.values()])
+            .values_list('product', flat=True).distinct()
+        )
+        unit_ids = {values['unique_unit_id'] for values in cleaned.values() if values.get('unique_unit_id')}
+        owners = dict(
+            Product.objects.filter(unique_unit_id__in=unit_ids).values_list('unique_unit_id', 'client_id')
+        )
+
+        objs, created, updated = [], [], []
+        for client_id, values in cleaned.items():
+            result = results[pending[client_id]]
+            row = existing.get(client_id)
+            if row and row['seller_id'] != seller.pk:
+                result['status'] = FORBIDDEN
+                continue
+            if row and row['pk'] in with_bids:
+                result['status'] = LOCKED
+                continue
+            unit_id = values['unique_unit_id'] if 'unique_unit_id' in values else (row or {}).get('unique_unit_id')
+            if unit_id and owners.setdefault(unit_id, client_id) != client_id:
+                result['status'] = CONFLICT
+                result['errors'] = {'unique_unit_id': ['Another unit already has this ID.']}
+                continue
+            if row:
+                values = {**{name: row[name] for name in attnames}, **values}
+                if all(values[name] == row[name] for name in attnames):
+                    result.update(status=UNCHANGED, id=row['pk'])
+                    continue
+                updated.append((client_id, row, values))
+                # The version bump makes cached fragments and order books reload, as a save would
+                objs.append(Product(client_id=client_id, seller=seller, version=row['version'] + 1, **values))
+            else:
+                values = {**listing_defaults(values.get('starting_price')), **values}
+                missing = [
+                    name for name in ('title', 'description', 'category') if values.get(fields[name].attname) in (None, '')
+                ]
+                if missing:
+                    result.update(status=INVALID, errors={name: ['This field is required.'] for name in missing})
+                    continue
+                created.append((client_id, values))
+                objs.append(Product(client_id=client_id, seller=seller, **values))
+
+        if objs:
+            Product.objects.bulk_create(
+                objs, batch_size=500, update_conflicts=True, unique_fields=['client_id'],
+                update_fields=attnames + ['version'],
+            )
+        pks = dict(
+            Product.objects.filter(client_id__in=[obj.client_id for obj in objs]).values_list('client_id', 'pk')
+        )
+        for client_id, _ in created:
+            results[pending[client_id]].update(status=CREATED, id=pks[client_id])
+        for client_id, row, _ in updated:
+            results[pending[client_id]].update(status=UPDATED, id=row['pk'])
+
+        # bulk_create sends no post_save, so do what the inventory and unit ID receivers would
+        _recount(created, updated)
+        index_units(
+            [(pks[client_id], values.get('unique_unit_id')) for client_id, values in created]
+            + [(row['pk'], values['unique_unit_id']) for _, row, values in updated
+               if values['unique_unit_id'] != row['unique_unit_id']]
+        )
+        if updated:
+            transaction.on_commit(lambda: _forget(updated))
+    return results
+
+
+def listing_defaults(starting_price):
+    """Listing fields a new unit needs and neither a tablet nor ProductForm asks for; never applied to a replay"""
+    return {
+        'starting_bid': starting_price if starting_price is not None else Decimal('0'),
+        'end_time': timezone.now() + timedelta(days=settings.INTAKE_LISTING_DAYS),
+    }
+
+
+def _recount(created, updated):
+    """Net unit and weight changes per package, applied with one pair of UPDATEs each"""
+    changes = {}
+
+    def add(package_id, units, weight):
+        if package_id is not None:
+            total = changes.setdefault(package_id, [0, Decimal('0')])
+            total[0] += units
+            total[1] += weight or Decimal('0')
+
+    for _, values in created:
+        add(values.get('package_id'), 1, values.get('weight'))
+    for _, row, values in updated:
+        add(row['package_id'], -1, -(row['weight'] or Decimal('0')))
+        add(values['package_id'], 1, values['weight'])
+    for package_id, (units, weight) in changes.items():
+        adjust_package(package_id, units, weight)
+
+
+def _forget(updated):
+    package_ids = {pid for _, row, values in updated for pid in (row['package_id'], values['package_id']) if pid}
+    keys = [product_detail_key(row['pk']) for _, row, _ in updated]
+    for pk in Sale.objects.filter(packages__in=package_ids).values_list('pk', flat=True).distinct():
+        keys += [sale_detail_key(pk), sale_leaderboard_key(pk)]
+    invalidate(*keys)
+    for _, row, _ in updated:
+        order_books.discard(row['pk'])
@@ -0,0 +1,145 @@
+# SMASH Marketplace - Package and Sale Unit Counts
+# Scrap Metal Auction Sales Hub
+# File: auctions/inventory.py
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DEFERRED, Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Package, Product, Sale
+
+
+ZERO = Decimal('0')
+
+
+def _adjust(queryset, units, weight):
+    if units or weight:
+        queryset.update(
+            unit_count=Greatest(F('unit_count') + units, Value(0)),
+            total_weight=Greatest(F('total_weight') + weight, Value(ZERO)),
+        )
+
+
+def adjust_package(package_id, units, weight):
+    """Add units and lbs to a package and to every sale it is listed in"""
+    if package_id is None:
+        return
+    _adjust(Package.objects.filter(pk=package_id), units, weight)
+    _adjust(Sale.objects.filter(packages=package_id), units, weight)
+
+
+def _package_totals(package_ids):
+    totals = Package.objects.filter(pk__in=package_ids).values_list('unit_count', 'total_weight')
+    return sum(units for units, _ in totals), sum((weight for _, weight in totals), ZERO)
+
+
+@receiver(post_save, dispatch_uid='auctions.inventory.unit_saved')
+def unit_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not isinstance(instance, Product):
+        return
+    if update_fields is not None and not {'package', 'weight'} & set(update_fields):
+        return
+    loaded = {} if created else getattr(instance, '_loaded_values', {})
+    old_package_id = None if created else loaded.get('package_id', DEFERRED)
+    old_weight = None if created else loaded.get('weight', DEFERRED)
+    package_id = instance.__dict__.get('package_id', DEFERRED)
+    weight = instance.__dict__.get('weight', DEFERRED)
+    if DEFERRED in (old_package_id, old_weight, package_id, weight):
+        return  # Unknown starting point; reconcile_inventory repairs it
+    if old_package_id == package_id:
+        adjust_package(package_id, 0, (weight or ZERO) - (old_weight or ZERO))
+    else:
+        adjust_package(old_package_id, -1, -(old_weight or ZERO))
+        adjust_package(package_id, 1, weight or ZERO)
+    instance._loaded_values = {**loaded, 'package_id': package_id, 'weight': weight}
+
+
+@receiver(post_delete, dispatch_uid='auctions.inventory.unit_deleted')
+def unit_deleted(sender, instance, **kwargs):
+    # Subclass rows (Art, Book, ...) delete their Product row too; count that one only
+    if sender is not Product:
+        return
+    if not {'package_id', 'weight'} <= instance.__dict__.keys():
+        return  # Deferred fields can no longer be read; reconcile_inventory repairs the counts
+    adjust_package(instance.package_id, -1, -(instance.weight or ZERO))
+
+
+@receiver(pre_delete, sender=Package, dispatch_uid='auctions.inventory.package_deleted')
+def package_deleted(sender, instance, **kwargs):
+    """Its sale listings are deleted without m2m signals; take its units off those sales first"""
+    units, weight = _package_totals([instance.pk])
+    _adjust(Sale.objects.filter(packages=instance), -units, -weight)
+
+
+@receiver(m2m_changed, sender=Sale.packages.through, dispatch_uid='auctions.inventory.listing_changed')
+def listing_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Packages added to or removed from a sale (or sales to or from a package)"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if action == 'pre_clear':
+        pk_set = set(
+            instance.sales.values_list('pk', flat=True) if reverse else instance.packages.values_list('pk', flat=True)
+        )
+    if not pk_set:
+        return
+    # Totals are read back rather than taken from instance, whose counters may be stale
+    if reverse:
+        # instance is a Package listed in or delisted from the sales in pk_set
+        units, weight = _package_totals([instance.pk])
+        _adjust(Sale.objects.filter(pk__in=pk_set), sign * units, sign * weight)
+    else:
+        units, weight = _package_totals(pk_set)
+        _adjust(Sale.objects.filter(pk=instance.pk), sign * units, sign * weight)
+
+
+def reconcile_inventory(batch_size=500, dry_run=False):
+    """Recompute every package's and sale's counts from the units themselves
+
+    Batches of batch_size rows are compared with their recomputed counts in
+    one query, and only rows that drifted are rewritten, each batch in its
+    own short transaction. Yields ('packages' or 'sales', rows checked,
+    rows repaired) per batch; with dry_run nothing is written.
+    """
+    units = (
+        Product.objects.filter(package=OuterRef('pk')).order_by().values('package')
+        .annotate(count=Count('pk'), weight=Sum('weight'))
+    )
+    yield from _reconcile('packages', Package.objects, (
+        Coalesce(Subquery(units.values('count')), 0),
+        Coalesce(Subquery(units.values('weight')), Value(ZERO)),
+    ), batch_size, dry_run)
+
+    # Packages are done first, so sales add up the repaired package counts
+    listed = (
+        Package.objects.filter(sales=OuterRef('pk')).order_by().values('sales')
+        .annotate(count=Sum('unit_count'), weight=Sum('total_weight'))
+    )
+    yield from _reconcile('sales', Sale.objects, (
+        Coalesce(Subquery(listed.values('count')), 0),
+        Coalesce(Subquery(listed.values('weight')), Value(ZERO)),
+    ), batch_size, dry_run)
+
+
+def _reconcile(label, manager, expected, batch_size, dry_run):
+    units, weight = expected
+    last_pk = 0
+    while True:
+        pks = list(manager.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        with transaction.atomic():
+            drifted = list(
+                manager.filter(pk__in=pks)
+                .annotate(expected_units=units, expected_weight=weight)
+                .exclude(unit_count=F('expected_units'), total_weight=F('expected_weight'))
+                .values_list('pk', flat=True)
+            )
+            if drifted and not dry_run:
+                manager.filter(pk__in=drifted).update(unit_count=units, total_weight=weight)
+        last_pk = pks[-1]
+        yield label, len(pks), len(drifted)
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from auctions.archive import archivable_sales, archive_sales
+
+
+class Command(BaseCommand):
+    help = 'Moves settled sales, their units and bids out of the live tables into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive sales whose bidding closed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=50, help='Sales moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many sales qualify')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_sales(options['days']).count()
+            self.stdout.write(f'{count} sales would be archived.')
+            return
+
+        totals = [0, 0, 0]
+        for counts in archive_sales(options['days'], batch_size=options['batch_size']):
+            totals = [total + count for total, count in zip(totals, counts)]
+            self.stdout.write(f'Archived {counts[0]} sales, {counts[1]} units, {counts[2]} bids')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {totals[0]} sales, {totals[1]} units and {totals[2]} bids archived.'
+        ))
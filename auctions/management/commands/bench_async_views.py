@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Compares sync WSGI and async ASGI throughput of the product pages '
+            'under many concurrent slow clients (run create_test_data first). '
+            'The gap measures how each mode waits on slow clients: a WSGI worker '
+            'is blocked for the whole delay, an ASGI client only holds a coroutine. '
+            'Queries run one at a time on a single thread in both modes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/products/', help='Page to request')
+        parser.add_argument('--requests', type=int, default=400, help='Total requests per mode')
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent clients')
+        parser.add_argument('--client-delay', type=float, default=0.5,
+                            help='Seconds each slow client takes to deliver its request')
+        parser.add_argument('--workers', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], help='Run a single mode (internal)')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            run = self.run_wsgi if options['mode'] == 'wsgi' else self.run_asgi
+            latencies, errors, elapsed = run(options)
+            self.stdout.write(json.dumps({'latencies': latencies, 'errors': errors, 'elapsed': elapsed}))
+            return
+
+        # Each mode runs in its own process so the URLconf picks the matching views
+        self.stdout.write(f"{options['requests']} requests, {options['clients']} clients, "
+                          f"{options['client_delay']}s client delay, {options['workers']} WSGI workers")
+        if not options['client_delay']:
+            self.stdout.write('No client delay: ASGI has no slow clients to overlap, so expect no gain')
+        for mode in ('wsgi', 'asgi'):
+            result = self.run_subprocess(mode, options)
+            latencies = sorted(result['latencies'])
+            self.stdout.write(
+                f"{mode.upper()}: {len(latencies) / result['elapsed']:.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, "
+                f"{result['errors']} non-200 responses"
+            )
+
+    def run_subprocess(self, mode, options):
+        env = dict(os.environ, AUCTIONHUB_ASYNC_VIEWS='1' if mode == 'asgi' else '0')
+        command = [
+            sys.executable, sys.argv[0], 'bench_async_views', '--mode', mode,
+            '--path', options['path'],
+            '--requests', str(options['requests']),
+            '--clients', str(options['clients']),
+            '--client-delay', str(options['client_delay']),
+            '--workers', str(options['workers']),
+        ]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def run_wsgi(self, options):
+        """A fixed pool of sync workers, each blocked while its client trickles in"""
+        handler = WSGIHandler()
+        environ = RequestFactory()._base_environ(PATH_INFO=options['path'], HTTP_HOST='localhost')
+
+        def request():
+            started = time.perf_counter()
+            time.sleep(options['client_delay'])
+            statuses = []
+            response = handler(dict(environ), lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - started, statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(lambda _: request(), range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], sum(1 for _, ok in results if not ok), elapsed
+
+    def run_asgi(self, options):
+        """One event loop serving every client; slow clients only hold a coroutine"""
+        handler = ASGIHandler()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': options['path'],
+            'raw_path': options['path'].encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+
+        async def request():
+            started = time.perf_counter()
+            delivered = False
+
+            async def receive():
+                nonlocal delivered
+                if delivered:
+                    # Keep the disconnect listener waiting until the response is sent
+                    await asyncio.Event().wait()
+                delivered = True
+                await asyncio.sleep(options['client_delay'])
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            statuses = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            await handler(dict(scope), receive, send)
+            return time.perf_counter() - started, statuses == [200]
+
+        async def client(count):
+            return [await request() for _ in range(count)]
+
+        async def run():
+            per_client, extra = divmod(options['requests'], options['clients'])
+            counts = [per_client + (1 if i < extra else 0) for i in range(options['clients'])]
+            results = await asyncio.gather(*(client(count) for count in counts if count))
+            return [result for client_results in results for result in client_results]
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        return [latency for latency, _ in results], sum(1 for _, ok in results if not ok), elapsed
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from auctionhub.sharedcache import SharedMemoryCache
+
+
+VALUES = {
+    'small': 42,
+    'medium': {'title': 'OEM converter', 'bids': [{'user': i, 'amount': 100 + i} for i in range(40)]},
+    'large': {'units': [{'id': f'CAT-2025-{i:04d}', 'title': 'OEM converter', 'bid': i} for i in range(600)]},
+}
+
+
+def make_backends(directory):
+    return {
+        'locmem': lambda: LocMemCache('bench', {'OPTIONS': {'MAX_ENTRIES': 100000}}),
+        'file': lambda: FileBasedCache(os.path.join(directory, 'file'), {'OPTIONS': {'MAX_ENTRIES': 100000}}),
+        'shared': lambda: SharedMemoryCache(os.path.join(directory, 'shared.cache'), {}),
+    }
+
+
+def _worker(make, keys, operations, seed, queue):
+    """Read hot keys, filling misses as a page view would, and delete some as edits do"""
+    cache = make()
+    rng = random.Random(seed)
+    hits = misses = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = keys[int(len(keys) * rng.random() ** 2)]  # Skewed towards the first keys
+        if rng.random() < 0.01:
+            cache.delete(key)
+            continue
+        if cache.get(key) is None:
+            misses += 1
+            cache.set(key, VALUES['medium'], 300)
+        else:
+            hits += 1
+    queue.put((hits, misses, time.perf_counter() - started))
+
+
+class Command(BaseCommand):
+    help = ('Compares the shared-memory cache backend with LocMemCache and the file-based cache: '
+            'single-process latency per value size, then hit rate and throughput across worker processes '
+            'and whether a delete in one process reaches the others')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000, help='Operations per measurement')
+        parser.add_argument('--processes', type=int, default=4, help='Worker processes for the shared run')
+        parser.add_argument('--keys', type=int, default=2000, help='Distinct keys in the shared run')
+        parser.add_argument('--dir', help='Where the file and shared caches live (default: a temp dir, '
+                                          'under /dev/shm when it exists)')
+
+    def handle(self, *args, **options):
+        parent = options['dir'] or ('/dev/shm' if os.path.isdir('/dev/shm') else None)
+        directory = tempfile.mkdtemp(prefix='bench_cache_', dir=parent)
+        try:
+            backends = make_backends(directory)
+            self.latency(backends, options['operations'])
+            self.workers(backends, options)
+            self.coherence(backends)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def latency(self, backends, operations):
+        self.stdout.write(f'{"backend":<8} {"value":<7} {"set µs":>8} {"hit µs":>8} {"miss µs":>8}')
+        for name, make in backends.items():
+            cache = make()
+            for size, value in VALUES.items():
+                keys = [f'bench:{size}:{i}' for i in range(min(operations, 1000))]
+                timings = []
+                for operation in (
+                    lambda key: cache.set(key, value, 300),
+                    lambda key: cache.get(key),
+                    lambda key: cache.get(key + ':missing'),
+                ):
+                    started = time.perf_counter()
+                    for i in range(operations):
+                        operation(keys[i % len(keys)])
+                    timings.append((time.perf_counter() - started) / operations * 1e6)
+                self.stdout.write(f'{name:<8} {size:<7}' + ''.join(f' {timing:>8.1f}' for timing in timings))
+            cache.clear()
+
+    def workers(self, backends, options):
+        self.stdout.write('')
+        self.stdout.write(f'{options["processes"]} processes sharing {options["keys"]} hot keys:')
+        self.stdout.write(f'{"backend":<8} {"hit rate":>9} {"fills":>7} {"ops/s":>10}')
+        keys = [f'bench:hot:{i}' for i in range(options['keys'])]
+        context = multiprocessing.get_context('fork')
+        for name, make in backends.items():
+            make().clear()
+            queue = context.Queue()
+            processes = [
+                context.Process(target=_worker, args=(make, keys, options['operations'], seed, queue))
+                for seed in range(options['processes'])
+            ]
+            for process in processes:
+                process.start()
+            results = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            hits = sum(result[0] for result in results)
+            misses = sum(result[1] for result in results)
+            throughput = sum((result[0] + result[1]) / result[2] for result in results)
+            self.stdout.write(f'{name:<8} {hits / (hits + misses):>9.1%} {misses:>7} {throughput:>10.0f}')
+
+    def coherence(self, backends):
+        self.stdout.write('')
+        context = multiprocessing.get_context('fork')
+        for name, make in backends.items():
+            cache = make()
+            cache.set('bench:coherence', 'stale', 300)
+            process = context.Process(target=lambda: make().delete('bench:coherence'))
+            process.start()
+            process.join()
+            seen = cache.get('bench:coherence')
+            cache.clear()
+            result = self.style.SUCCESS('reaches') if seen is None else self.style.WARNING('does not reach')
+            self.stdout.write(f'{name:<8} a delete in another process {result} this one')
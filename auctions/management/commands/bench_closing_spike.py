@@ -0,0 +1,430 @@
+import asyncio
+import math
+import random
+import re
+import time
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+from django.utils.crypto import get_random_string
+
+from auctions.models import Product
+from auctions.orderbook import BUSY_MESSAGE
+
+
+MINIMUM_BID = re.compile(rb'id="bid_amount"[^>]*\bmin="([0-9.]+)"')
+STRATEGIES = ('increment', 'jump', 'snipe')
+
+
+def arrival_times(curve, count, duration, steepness):
+    """Sorted arrival offsets in [0, duration) drawn from the curve's density"""
+    times = []
+    for _ in range(count):
+        u = random.random()
+        if curve == 'flat':
+            t = u
+        elif curve == 'ramp':  # Density grows linearly towards the close
+            t = math.sqrt(u)
+        else:  # 'spike': density grows exponentially towards the close
+            t = math.log1p(u * math.expm1(steepness)) / steepness
+        times.append(t * duration)
+    return sorted(times)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class HTTPConnection:
+    """Just enough HTTP/1.1 over asyncio streams: keep-alive, Content-Length and chunked bodies"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reusable = True
+
+    @classmethod
+    async def open(cls, host, port, ssl):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl)
+        return cls(reader, writer)
+
+    async def request(self, method, path, headers, body=b''):
+        lines = [f'{method} {path} HTTP/1.1', *(f'{name}: {value}' for name, value in headers.items())]
+        if body:
+            lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        version, status = status_line.split(None, 2)[:2]
+        response_headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers.append((name.strip().lower(), value.strip()))
+        fields = dict(response_headers)
+
+        if fields.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while size := int((await self.reader.readline()).split(b';')[0], 16):
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            await self.reader.readline()
+            response_body = b''.join(chunks)
+        elif 'content-length' in fields:
+            response_body = await self.reader.readexactly(int(fields['content-length']))
+        elif method == 'HEAD' or status in (b'204', b'304'):
+            response_body = b''
+        else:
+            response_body = await self.reader.read()
+            self.reusable = False
+
+        connection = fields.get('connection', '').lower()
+        if connection == 'close' or (version == b'HTTP/1.0' and connection != 'keep-alive'):
+            self.reusable = False
+        return int(status), response_headers, response_body
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """At most max_size connections to the server, reused between bidders"""
+
+    def __init__(self, url, max_size):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.ssl = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.ssl else 80)
+        self.host_header = parts.netloc
+        self.slots = asyncio.Semaphore(max_size)
+        self.idle = []
+        self.waits = 0
+
+    async def request(self, method, path, headers, body=b'', timeout=30):
+        if self.slots.locked():
+            self.waits += 1
+        async with self.slots:
+            connection = self.idle.pop() if self.idle else None
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await HTTPConnection.open(self.host, self.port, self.ssl)
+                response = await asyncio.wait_for(
+                    connection.request(method, path, {'Host': self.host_header, **headers}, body), timeout
+                )
+            except BaseException:
+                if connection is not None:
+                    connection.close()
+                raise
+            if connection.reusable:
+                self.idle.append(connection)
+            else:
+                connection.close()
+            return (*response, time.perf_counter() - started)
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+class Stats:
+    """Outcomes and latencies bucketed by seconds since the start of the run"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.started = time.monotonic()
+        self.buckets = {}
+        self.active = 0
+
+    def bucket(self, index):
+        return self.buckets.setdefault(index, {'outcomes': Counter(), 'detail': [], 'bid': []})
+
+    def record(self, kind, outcome, latency):
+        bucket = self.bucket(int((time.monotonic() - self.started) / self.interval))
+        bucket['outcomes'][kind + ':' + outcome] += 1
+        if latency is not None:
+            bucket[kind].append(latency)
+
+
+class Bidder:
+    def __init__(self, username, cookies, strategy, products, arrival):
+        self.username = username
+        self.cookies = cookies
+        self.strategy = strategy
+        self.products = products
+        self.arrival = arrival
+
+    def cookie_header(self):
+        return '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+
+    def update_cookies(self, headers):
+        messages = None
+        for name, value in headers:
+            if name != 'set-cookie':
+                continue
+            for morsel in SimpleCookie(value).values():
+                if morsel.key == CookieStorage.cookie_name:
+                    # Read the flash messages like the next page would, but never send them back
+                    messages = morsel.value
+                elif morsel['max-age'] == '0':
+                    self.cookies.pop(morsel.key, None)
+                else:
+                    self.cookies[morsel.key] = morsel.value
+        return messages
+
+
+class Command(BaseCommand):
+    help = ('Rehearses the close of a LOT against a running server: synthetic bidders arrive along '
+            'an arrival curve, view units and bid on them, and accepted/rejected bids, lock errors, '
+            'throughput and latency percentiles are reported over time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--bidders', type=int, default=1000, help='Synthetic bidders (created if missing)')
+        parser.add_argument('--duration', type=float, default=60.0, help='Seconds to run')
+        parser.add_argument('--curve', choices=['flat', 'ramp', 'spike'], default='spike',
+                            help='How bidder arrivals are spread over the run')
+        parser.add_argument('--steepness', type=float, default=4.0,
+                            help='For --curve spike: arrivals in the last second are e^steepness '
+                                 'times as frequent as in the first')
+        parser.add_argument('--strategy', choices=[*STRATEGIES, 'mixed'], default='mixed',
+                            help='increment bids the minimum, jump bids up to --max-jump above it, snipe '
+                                 'waits for the last --snipe-window seconds; mixed picks one per bidder')
+        parser.add_argument('--max-jump', type=float, default=0.05,
+                            help='Largest jump above the minimum bid, as a fraction of it')
+        parser.add_argument('--snipe-window', type=float, default=5.0)
+        parser.add_argument('--think-time', type=float, default=2.0,
+                            help='Mean seconds a bidder waits between bids')
+        parser.add_argument('--lot', help='Lot number of the LOT to bid on (default: any active units)')
+        parser.add_argument('--products', type=int, default=20,
+                            help='How many units to bid on; each bidder follows a few of them')
+        parser.add_argument('--max-connections', type=int, default=256)
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as failed')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds per report line')
+        parser.add_argument('--prefix', default='loadbidder', help='Username prefix of the synthetic bidders')
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable arrivals and strategies')
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        products = Product.objects.filter(is_active=True)
+        if options['lot']:
+            products = products.filter(package__sales__lot_number=options['lot'])
+        product_ids = list(products.order_by('pk').values_list('pk', flat=True).distinct()[:options['products']])
+        if not product_ids:
+            raise CommandError('No active units to bid on; run create_test_data or check --lot.')
+
+        users = self.ensure_users(options['prefix'], options['bidders'])
+        arrivals = arrival_times(options['curve'], len(users), options['duration'], options['steepness'])
+        bidders = []
+        for user, arrival in zip(users, arrivals):
+            strategy = options['strategy']
+            if strategy == 'mixed':
+                strategy = random.choice(STRATEGIES)
+            # Bidders follow a few units each, so the popular ones get most of the traffic
+            followed = random.sample(product_ids, min(3, len(product_ids)))
+            bidders.append(Bidder(user.username, self.log_in(user), strategy, followed, arrival))
+
+        self.stdout.write(
+            f"{len(bidders)} bidders on {len(product_ids)} units over {options['duration']:.0f}s "
+            f"({options['curve']} arrivals, {options['strategy']} strategy) against {options['url']}"
+        )
+        stats = asyncio.run(self.run(bidders, options))
+        self.report_totals(stats)
+
+    def ensure_users(self, prefix, count):
+        usernames = [f'{prefix}{i:05d}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        password = make_password(None)  # Bidders never log in with a password; hashing thousands would take minutes
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in usernames if name not in existing],
+            batch_size=500,
+        )
+        return list(User.objects.filter(username__in=usernames, is_active=True).order_by('username'))
+
+    @staticmethod
+    def log_in(user):
+        """Cookies for a signed-in session, written the way django.contrib.auth.login() would"""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return {
+            settings.SESSION_COOKIE_NAME: session.session_key,
+            # An unmasked secret is a valid token in both the cookie and the header
+            settings.CSRF_COOKIE_NAME: get_random_string(32),
+        }
+
+    async def run(self, bidders, options):
+        pool = ConnectionPool(options['url'], options['max_connections'])
+        try:
+            await pool.request('GET', '/', {}, timeout=options['timeout'])
+        except OSError as e:
+            raise CommandError(f"Cannot reach {options['url']} ({e}); start the server first.")
+
+        stats = Stats(options['interval'])
+        deadline = stats.started + options['duration']
+        reporter = asyncio.create_task(self.report_intervals(stats, deadline))
+        try:
+            await asyncio.gather(*(self.bid_loop(bidder, pool, stats, deadline, options) for bidder in bidders))
+        finally:
+            reporter.cancel()
+            pool.close()
+        if pool.waits:
+            self.stdout.write(self.style.WARNING(
+                f'{pool.waits} requests waited for one of the {options["max_connections"]} connections; '
+                f'raise --max-connections if the server is not the bottleneck'
+            ))
+        return stats
+
+    async def bid_loop(self, bidder, pool, stats, deadline, options):
+        await asyncio.sleep(max(0.0, stats.started + bidder.arrival - time.monotonic()))
+        if bidder.strategy == 'snipe':
+            await asyncio.sleep(max(0.0, deadline - random.uniform(0, options['snipe_window']) - time.monotonic()))
+        stats.active += 1
+        try:
+            while time.monotonic() < deadline:
+                product_id = random.choice(bidder.products)
+                minimum = await self.view(bidder, product_id, pool, stats, options)
+                if minimum is not None and time.monotonic() < deadline:
+                    await self.bid(bidder, product_id, self.amount(bidder, minimum, options), pool, stats, options)
+                # Snipers keep bidding for the final seconds; the others come back after a while
+                think = 0 if bidder.strategy == 'snipe' else random.expovariate(1 / options['think_time'])
+                await asyncio.sleep(min(think, max(0.0, deadline - time.monotonic())))
+        finally:
+            stats.active -= 1
+
+    async def view(self, bidder, product_id, pool, stats, options):
+        """Load the unit's page as the bidder; returns the minimum bid it shows, if any"""
+        try:
+            status, headers, body, latency = await pool.request(
+                'GET', f'/products/{product_id}/', {'Cookie': bidder.cookie_header()}, timeout=options['timeout']
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            stats.record('detail', 'error', None)
+            return None
+        bidder.update_cookies(headers)
+        stats.record('detail', self.classify_status(status, body) or 'ok', latency)
+        match = MINIMUM_BID.search(body) if status == 200 else None
+        try:
+            return Decimal(match.group(1).decode()) if match else None
+        except InvalidOperation:
+            return None
+
+    async def bid(self, bidder, product_id, amount, pool, stats, options):
+        headers = {
+            'Cookie': bidder.cookie_header(),
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': bidder.cookies[settings.CSRF_COOKIE_NAME],
+        }
+        body = urlencode({'bid_amount': str(amount)}).encode()
+        try:
+            status, response_headers, response_body, latency = await pool.request(
+                'POST', f'/products/{product_id}/bid/', headers, body, timeout=options['timeout']
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            stats.record('bid', 'error', None)
+            return
+        messages = bidder.update_cookies(response_headers)
+        outcome = self.classify_status(status, response_body)
+        if outcome is None:
+            outcome = self.classify_messages(messages) if status == 302 else 'error'
+        stats.record('bid', outcome, latency)
+
+    @staticmethod
+    def amount(bidder, minimum, options):
+        if bidder.strategy == 'jump':
+            jump = minimum * Decimal(str(random.uniform(0, options['max_jump'])))
+            return (minimum + jump).quantize(Decimal('0.01'))
+        return minimum
+
+    @staticmethod
+    def classify_status(status, body):
+        if status >= 500:
+            # Only DEBUG error pages name the exception; otherwise a lock timeout is just a 500
+            return 'lock_error' if b'database is locked' in body else 'error'
+        if status >= 400:
+            return 'error'
+        return None
+
+    @staticmethod
+    def classify_messages(cookie):
+        """accepted/rejected/busy from the flash messages the bid redirect set"""
+        if cookie is None:
+            return 'error'  # Redirected without a message, e.g. to the login page
+        messages = CookieStorage(HttpRequest())._decode(cookie) or []
+        tags = {message.level_tag for message in messages}
+        if 'success' in tags:
+            return 'accepted'
+        if any(message.message == BUSY_MESSAGE for message in messages):
+            return 'busy'
+        return 'rejected' if 'error' in tags else 'error'
+
+    async def report_intervals(self, stats, deadline):
+        self.stdout.write(
+            f"{'t(s)':>6} {'bidders':>8} {'req/s':>7} {'accepted':>9} {'rejected':>9} {'busy':>6} "
+            f"{'locked':>7} {'errors':>7} {'view p50/p95 ms':>16} {'bid p50/p95/p99 ms':>21}"
+        )
+        index = 0
+        while True:
+            await asyncio.sleep(max(0.0, stats.started + (index + 1) * stats.interval - time.monotonic()))
+            self.report_interval(stats, index, active=stats.active)
+            index += 1
+
+    def report_interval(self, stats, index, active=None):
+        if index not in stats.buckets:
+            return
+        bucket = stats.buckets.pop(index)
+        outcomes = bucket['outcomes']
+        stats.bucket('total')['outcomes'].update(outcomes)
+        stats.bucket('total')['detail'].extend(bucket['detail'])
+        stats.bucket('total')['bid'].extend(bucket['bid'])
+        requests = sum(outcomes.values())
+        self.stdout.write(
+            f"{(index + 1) * stats.interval:>6.0f} {'' if active is None else active:>8} "
+            f"{requests / stats.interval:>7.0f} {outcomes['bid:accepted']:>9} {outcomes['bid:rejected']:>9} "
+            f"{outcomes['bid:busy']:>6} {outcomes['detail:lock_error'] + outcomes['bid:lock_error']:>7} "
+            f"{outcomes['detail:error'] + outcomes['bid:error']:>7} "
+            f"{self.latencies(bucket['detail'], (50, 95)):>16} {self.latencies(bucket['bid'], (50, 95, 99)):>21}"
+        )
+
+    @staticmethod
+    def latencies(values, percentiles):
+        return '/'.join(f'{percentile(values, pct) * 1000:.0f}' for pct in percentiles) if values else '-'
+
+    def report_totals(self, stats):
+        for index in sorted(key for key in stats.buckets if key != 'total'):
+            self.report_interval(stats, index)
+        total = stats.bucket('total')
+        outcomes = total['outcomes']
+        elapsed = time.monotonic() - stats.started
+        bids = sum(count for key, count in outcomes.items() if key.startswith('bid:'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(outcomes.values())} requests in {elapsed:.1f}s ({sum(outcomes.values()) / elapsed:.0f}/s); "
+            f"{bids} bids: {outcomes['bid:accepted']} accepted, {outcomes['bid:rejected']} rejected, "
+            f"{outcomes['bid:busy']} busy, {outcomes['bid:lock_error'] + outcomes['detail:lock_error']} lock errors, "
+            f"{outcomes['bid:error'] + outcomes['detail:error']} other errors"
+        ))
+        self.stdout.write(
+            f"latency ms (p50/p95/p99): view {self.latencies(total['detail'], (50, 95, 99))}, "
+            f"bid {self.latencies(total['bid'], (50, 95, 99))}"
+        )
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from auctions.views import ProductListView
+
+
+class Command(BaseCommand):
+    help = ('Measures product list render time with cold and warm product card '
+            'fragment caches, and how many cards came from the cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5, help='List pages to render')
+        parser.add_argument('--rounds', type=int, default=20, help='Renders per page and cache state')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        view = ProductListView.as_view()
+        requests = []
+        for page in range(1, options['pages'] + 1):
+            request = factory.get('/products/', {'page': page})
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        self.stdout.write(f'{"cache":>6} {"ms/page":>9} {"queries/page":>13} {"cards cached":>13}')
+        for state in ('cold', 'warm'):
+            elapsed = queries = cards = cached_cards = 0
+            for _ in range(options['rounds']):
+                if state == 'cold':
+                    cache.clear()
+                for request in requests:
+                    response = view(request)
+                    products = response.context_data['products']
+                    cards += len(products)
+                    cached_cards += sum(
+                        1 for product in products
+                        if cache.has_key(make_template_fragment_key('product_card', [product.pk, product.version]))
+                    )
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response.render()
+                        elapsed += time.perf_counter() - started
+                    queries += len(captured)
+            renders = options['rounds'] * len(requests)
+            self.stdout.write(
+                f'{state:>6} {elapsed / renders * 1000:>9.2f} {queries / renders:>13.1f} '
+                f'{f"{cached_cards}/{cards}":>13}'
+            )
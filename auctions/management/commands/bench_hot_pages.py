@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from auctions.cache import invalidate_product
+from auctions.models import Product
+from auctions.views import ProductDetailView
+
+
+class UncachedProductDetailView(ProductDetailView):
+    """The detail view as it was before the single-flight cache"""
+
+    def get_object(self, queryset=None):
+        self.detail = self.build_detail()
+        return self.detail['product']
+
+
+class Command(BaseCommand):
+    help = ('Load-tests the product detail context under concurrent viewers and '
+            'periodic bids, reporting database queries per second with and without the cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, help='Product id (defaults to the first active product)')
+        parser.add_argument('--viewers', type=int, nargs='+', default=[1, 10, 50, 100, 200])
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds per run')
+        parser.add_argument('--bid-interval', type=float, default=0.5,
+                            help='Seconds between simulated bids that invalidate the page')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(is_active=True).order_by('pk').first()
+        if options['product']:
+            product = Product.objects.filter(pk=options['product']).first()
+        if product is None:
+            raise CommandError('No product to load-test; run create_test_data first.')
+
+        self.stdout.write(f'{"viewers":>8} {"mode":>9} {"views/s":>9} {"queries/s":>10}')
+        for viewers in options['viewers']:
+            for view_class in (UncachedProductDetailView, ProductDetailView):
+                cache.clear()
+                views, queries = self.run(view_class, product, viewers, options)
+                mode = 'cached' if view_class is ProductDetailView else 'uncached'
+                self.stdout.write(
+                    f'{viewers:>8} {mode:>9} {views / options["duration"]:>9.0f} '
+                    f'{queries / options["duration"]:>10.0f}'
+                )
+
+    def run(self, view_class, product, viewers, options):
+        request = RequestFactory().get(f'/products/{product.pk}/')
+        counts = {'views': 0, 'queries': 0}
+        counts_lock = threading.Lock()
+        stop = threading.Event()
+
+        def count_query(execute, sql, params, many, context):
+            with counts_lock:
+                counts['queries'] += 1
+            return execute(sql, params, many, context)
+
+        def viewer():
+            views = 0
+            with connection.execute_wrapper(count_query):
+                while not stop.is_set():
+                    view = view_class()
+                    view.setup(request, pk=product.pk)
+                    view.object = view.get_object()
+                    view.get_context_data(object=view.object)
+                    views += 1
+            connection.close()
+            with counts_lock:
+                counts['views'] += views
+
+        def bidder():
+            # Only the invalidation matters here; the bid write itself is not measured
+            while not stop.wait(options['bid_interval']):
+                invalidate_product(product)
+            connection.close()
+
+        threads = [threading.Thread(target=viewer) for _ in range(viewers)]
+        threads.append(threading.Thread(target=bidder))
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts['views'], counts['queries']
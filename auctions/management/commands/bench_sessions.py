@@ -0,0 +1,88 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from auctions.models import Product
+from auctions.orderbook import order_books
+
+
+# Django's defaults: sessions and messages in the database, request.user loaded every request
+BASELINE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+FAST_PATHS = {
+    'cached_db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+        'AUTHENTICATION_BACKENDS': ['auctionhub.auth.CachedModelBackend'],
+    },
+    'signed_cookies': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+        'AUTHENTICATION_BACKENDS': ['auctionhub.auth.CachedModelBackend'],
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Counts database queries per authenticated page with Django\'s default sessions and '
+            'messages and with each session/message fast path (changes are rolled back)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Bidder to browse as (default: a non-staff user who has bid)')
+        parser.add_argument('--paths', default='/products/,/sales/,/user_dashboard/,/favorites/,'
+                                               '/submitted_bids/,/settlement_history/',
+                            help='Comma-separated pages to request')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_staff=False)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.filter(bids__isnull=False).first() or users.first()
+        product = Product.objects.filter(is_active=True).exclude(seller=user).first()
+        if user is None or product is None:
+            raise CommandError('Needs a bidder and an active product from another seller; run create_test_data.')
+
+        pages = [('GET ' + path, path) for path in options['paths'].split(',') if path]
+        pages.append(('POST bid', f'/products/{product.pk}/bid/'))
+
+        results = {}
+        for name, config in [('default', BASELINE), *FAST_PATHS.items()]:
+            # Every configuration starts from the same data
+            with transaction.atomic(), override_settings(**config):
+                results[name] = self.measure(user, pages, product)
+                transaction.set_rollback(True)
+            order_books.discard(product.pk)
+
+        names = list(results)
+        self.stdout.write(f"{'page':<28}" + ''.join(f'{name:>16}' for name in names))
+        for label, _ in pages:
+            self.stdout.write(f'{label:<28}' + ''.join(f'{results[name][label]:>16}' for name in names))
+        totals = {name: sum(results[name].values()) for name in names}
+        self.stdout.write(f"{'total':<28}" + ''.join(f'{totals[name]:>16}' for name in names))
+        for name in names[1:]:
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: {totals['default'] - totals[name]} of {totals['default']} queries removed"
+            ))
+
+    def measure(self, user, pages, product):
+        client = Client()
+        client.force_login(user)
+        counts = {}
+        for label, path in pages:
+            # The first request fills the session and user caches; count the second
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as queries:
+                    if label.startswith('POST'):
+                        amount = (product.current_item_bid or product.starting_price or 0) + 1
+                        product.current_item_bid = amount
+                        client.post(path, {'bid_amount': str(amount)})
+                    else:
+                        client.get(path)
+            counts[label] = len(queries)
+        return counts
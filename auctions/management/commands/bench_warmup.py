@@ -0,0 +1,121 @@
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Compares startup time, first-request latency and memory per forked worker '
+            'with and without the pre-fork warm-up (Linux only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paths', default='/products/,/sales/,/',
+                            help='Comma-separated pages each worker requests')
+        parser.add_argument('--workers', type=int, default=4, help='Workers forked per mode')
+        parser.add_argument('--mode', choices=['cold', 'warm'], help='Run a single mode (internal)')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork') or not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('This benchmark needs fork() and /proc/<pid>/smaps_rollup (Linux).')
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        # Each mode runs in a fresh interpreter so nothing is imported or compiled up front
+        self.stdout.write(f"{options['workers']} workers, pages: {options['paths']}")
+        for mode in ('cold', 'warm'):
+            result = self.run_subprocess(mode, options)
+            workers = result['workers']
+            self.stdout.write(
+                f"{mode.upper()}: master startup {result['startup'] * 1000:.0f} ms | per worker: "
+                f"first requests {statistics.mean(w['first'] for w in workers) * 1000:.1f} ms, "
+                f"repeat {statistics.mean(w['repeat'] for w in workers) * 1000:.1f} ms, "
+                f"RSS {statistics.mean(w['rss'] for w in workers) / 1024:.1f} MB, "
+                f"private {statistics.mean(w['private'] for w in workers) / 1024:.1f} MB, "
+                f"PSS {statistics.mean(w['pss'] for w in workers) / 1024:.1f} MB"
+            )
+
+    def run_subprocess(self, mode, options):
+        env = dict(os.environ, AUCTIONHUB_WARM_UP='1' if mode == 'warm' else '0')
+        command = [
+            sys.executable, sys.argv[0], 'bench_warmup', '--mode', mode,
+            '--paths', options['paths'], '--workers', str(options['workers']),
+        ]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def run_mode(self, options):
+        """Start the app like a pre-forking server would, then fork workers that serve the pages"""
+        started = time.perf_counter()
+        from auctionhub.wsgi import application
+        startup = time.perf_counter() - started
+
+        paths = [path for path in options['paths'].split(',') if path]
+        results_r, results_w = os.pipe()
+        release_r, release_w = os.pipe()
+        children = []
+        for _ in range(options['workers']):
+            pid = os.fork()
+            if pid == 0:
+                os.close(results_r)
+                os.close(release_w)
+                try:
+                    result = self.serve(application, paths)
+                    os.write(results_w, (json.dumps(result) + '\n').encode())
+                    # Stay alive until every sibling has measured, so shared pages count as shared
+                    os.read(release_r, 1)
+                finally:
+                    os._exit(0)
+            children.append(pid)
+
+        os.close(results_w)
+        os.close(release_r)
+        workers = []
+        with os.fdopen(results_r) as results:
+            for line in results:
+                workers.append(json.loads(line))
+                if len(workers) == len(children):
+                    break
+        os.close(release_w)
+        for pid in children:
+            os.waitpid(pid, 0)
+        return {'startup': startup, 'workers': workers}
+
+    @staticmethod
+    def serve(application, paths):
+        factory = RequestFactory()
+
+        def request(path):
+            environ = factory._base_environ(PATH_INFO=path, HTTP_HOST='localhost')
+            response = application(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+
+        timings = {}
+        for label in ('first', 'repeat'):
+            started = time.perf_counter()
+            for path in paths:
+                request(path)
+            timings[label] = time.perf_counter() - started
+
+        # A long-running worker eventually does a full collection, which writes to (and so
+        # un-shares) the header of every object the collector can see
+        gc.collect()
+        memory = {}
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    memory[key] = int(value.split()[0])
+        return {
+            **timings,
+            'rss': memory['Rss'],
+            'pss': memory['Pss'],
+            'private': memory['Private_Clean'] + memory['Private_Dirty'],
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from auctions.unitsearch import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the unit ID trigram index behind /products/lookup/ from every unit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Units indexed per transaction')
+
+    def handle(self, *args, **options):
+        indexed = 0
+        for indexed, total in rebuild_index(options['batch_size']):
+            self.stdout.write(f'{indexed}/{total} units indexed')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} units.'))
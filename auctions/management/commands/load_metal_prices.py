@@ -0,0 +1,61 @@
+import csv
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.models import MetalPrice
+from auctions.pricing import current_prices, reprice_inventory, schedule_repricing
+
+
+DEFAULT_FILE = Path(__file__).resolve().parents[2] / 'data' / 'metal_prices.csv'
+
+
+class Command(BaseCommand):
+    help = 'Loads metal spot prices and re-appraises active units when the latest prices change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(DEFAULT_FILE),
+                            help='CSV with metal,as_of,price_per_ozt columns (as_of is YYYY-MM-DD)')
+        parser.add_argument('--now', action='store_true',
+                            help='Reprice in this process instead of queueing a background task')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Units per repricing transaction (default: REPRICE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        with open(options['file'], newline='', encoding='utf-8') as f:
+            rows = csv.DictReader(line for line in f if not line.startswith('#'))
+            prices = [
+                MetalPrice(
+                    metal=row['metal'].strip().upper(),
+                    as_of=date.fromisoformat(row['as_of'].strip()),
+                    price_per_ozt=Decimal(row['price_per_ozt']),
+                )
+                for row in rows
+            ]
+
+        before = current_prices()
+        with transaction.atomic():
+            # bulk_create sends no post_save, so repricing is scheduled below rather than per row
+            MetalPrice.objects.bulk_create(
+                prices,
+                update_conflicts=True,
+                unique_fields=['metal', 'as_of'],
+                update_fields=['price_per_ozt'],
+            )
+        self.stdout.write(f'Loaded {len(prices)} metal prices.')
+
+        if current_prices() == before:
+            self.stdout.write(self.style.SUCCESS('Latest prices unchanged; nothing to reprice.'))
+            return
+        if not options['now']:
+            schedule_repricing()
+            self.stdout.write(self.style.SUCCESS('Latest prices changed; repricing queued.'))
+            return
+
+        checked = changed = 0
+        for checked, changed, total in reprice_inventory(batch_size=options['batch_size']):
+            self.stdout.write(f'  {checked}/{total} units checked, {changed} changed')
+        self.stdout.write(self.style.SUCCESS(f'Repriced {changed} of {checked} units.'))
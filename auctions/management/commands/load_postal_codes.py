@@ -0,0 +1,53 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auctions.models import PostalCode, Sale
+
+
+DEFAULT_FILE = Path(__file__).resolve().parents[2] / 'data' / 'postal_codes.csv'
+
+
+class Command(BaseCommand):
+    help = 'Loads postal code centroids for radius search and geocodes sales that have no coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(DEFAULT_FILE),
+                            help='CSV with code,place_name,province,latitude,longitude columns')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with open(options['file'], newline='', encoding='utf-8') as f:
+            rows = csv.DictReader(line for line in f if not line.startswith('#'))
+            postal_codes = [
+                PostalCode(
+                    code=PostalCode.normalize(row['code']),
+                    place_name=row['place_name'],
+                    province=row['province'],
+                    latitude=float(row['latitude']),
+                    longitude=float(row['longitude']),
+                )
+                for row in rows
+            ]
+
+        with transaction.atomic():
+            PostalCode.objects.bulk_create(
+                postal_codes,
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=['place_name', 'province', 'latitude', 'longitude'],
+            )
+        self.stdout.write(f'Loaded {len(postal_codes)} postal code centroids.')
+
+        centroids = {p.code: p for p in PostalCode.objects.all()}
+        sales = []
+        for sale in Sale.objects.filter(latitude__isnull=True).only('id', 'zip_code').iterator():
+            centroid = centroids.get(PostalCode.normalize(sale.zip_code))
+            if centroid:
+                sale.latitude, sale.longitude = centroid.latitude, centroid.longitude
+                sales.append(sale)
+        Sale.objects.bulk_update(sales, ['latitude', 'longitude'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {len(sales)} sales.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from auctions.inventory import reconcile_inventory
+
+
+class Command(BaseCommand):
+    help = 'Recomputes package and sale unit counts and weights, repairing any that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows checked per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows drifted')
+
+    def handle(self, *args, **options):
+        totals = {}
+        for label, checked, drifted in reconcile_inventory(options['batch_size'], dry_run=options['dry_run']):
+            total = totals.setdefault(label, [0, 0])
+            total[0] += checked
+            total[1] += drifted
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        for label, (checked, drifted) in totals.items():
+            self.stdout.write(self.style.SUCCESS(f'{label.capitalize()}: {checked} checked, {drifted} {verb}.'))
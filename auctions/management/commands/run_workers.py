@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from auctions import process_worker
+from auctions.queue import claim_tasks, execute_task, heartbeat, queue_stats, requeue_stale
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Runs background tasks from the database queue with a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Tasks run in parallel')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait for work when the queue is empty')
+        parser.add_argument('--lock-timeout', type=int, default=600,
+                            help='Seconds without a heartbeat after which a RUNNING task is assumed orphaned '
+                                 'and requeued; running tasks get a heartbeat every third of this')
+        parser.add_argument('--stats-interval', type=float, default=30.0,
+                            help='Seconds between throughput/queue depth reports (0 disables)')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue has no ready tasks')
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        if options['pool'] == 'process':
+            # Spawned, not forked, so children never share the parent's DB connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=process_worker.setup,
+            )
+            run = process_worker.execute_task
+        else:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            run = execute_task
+
+        self.stdout.write(f"Worker {worker_id} running {options['workers']} {options['pool']} workers")
+        requeue_stale(options['lock_timeout'])
+        inflight = {}  # Future -> task pk
+        totals = {'DONE': 0, 'RETRY': 0, 'FAILED': 0, 'ERROR': 0}
+        window_done = 0
+        window_started = last_stale_check = last_heartbeat = time.monotonic()
+
+        with pool:
+            while not self.stopping:
+                for pk in claim_tasks(worker_id, options['workers'] - len(inflight)):
+                    inflight[pool.submit(run, pk)] = pk
+
+                if not inflight:
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+                else:
+                    done, _ = wait(inflight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        totals[self.outcome(future, inflight.pop(future))] += 1
+                        window_done += 1
+
+                now = time.monotonic()
+                if now - last_heartbeat > options['lock_timeout'] / 3:
+                    heartbeat(worker_id, list(inflight.values()))
+                    last_heartbeat = now
+                if now - last_stale_check > options['lock_timeout'] / 2:
+                    requeue_stale(options['lock_timeout'])
+                    last_stale_check = now
+                if options['stats_interval'] and now - window_started >= options['stats_interval']:
+                    self.report(window_done / (now - window_started), totals)
+                    window_done, window_started = 0, now
+
+            for future in wait(inflight).done:
+                totals[self.outcome(future, inflight[future])] += 1
+                window_done += 1
+        elapsed = time.monotonic() - window_started
+        self.report(window_done / elapsed if elapsed else 0, totals)
+
+    @staticmethod
+    def outcome(future, pk):
+        """The task's final status, or ERROR when recording it failed (it is requeued once stale)"""
+        try:
+            return future.result()
+        except Exception:
+            logger.exception('Task %s could not be run or its outcome recorded', pk)
+            return 'ERROR'
+
+    def stop(self, signum, frame):
+        self.stdout.write('Finishing running tasks, then stopping...')
+        self.stopping = True
+
+    def report(self, throughput, totals):
+        self.stdout.write(
+            f"{throughput:.1f} tasks/s | done {totals['DONE']}, retried {totals['RETRY']}, "
+            f"failed {totals['FAILED']}, errors {totals['ERROR']}"
+        )
+        for row in queue_stats():
+            self.stdout.write(
+                f"  {row['name']}: {row['ready']} ready, {row['delayed']} delayed, {row['running']} running"
+            )
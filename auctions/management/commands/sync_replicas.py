@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from auctionhub.db import PRIMARY
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database over each local read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep copying every N seconds to simulate replication lag (0 copies once)')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set AUCTIONHUB_DB_REPLICAS.')
+        for alias in [PRIMARY, *settings.DATABASE_REPLICAS]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"'{alias}' is not SQLite; replicate it with the database server instead.")
+
+        while True:
+            start = time.perf_counter()
+            for alias in settings.DATABASE_REPLICAS:
+                self.copy(str(settings.DATABASES[alias]['NAME']))
+            self.stdout.write(
+                f'Synced {len(settings.DATABASE_REPLICAS)} replicas in {time.perf_counter() - start:.2f}s'
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+            connections[PRIMARY].close()
+
+    def copy(self, path):
+        """Snapshot the primary with the online backup API, then swap it in atomically
+
+        Open replica connections keep reading the old file until they
+        reconnect, which Django does at the end of every request.
+        """
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        tmp_path = f'{path}.tmp'
+        target = sqlite3.connect(tmp_path)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
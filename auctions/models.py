@@ -1,7 +1,12 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Cast, Coalesce, Rank
 from django.contrib.auth.models import User
+from django.utils import timezone
 from model_utils.managers import InheritanceManager
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 class Category(models.Model):
@@ -11,7 +16,153 @@ class Category(models.Model):
         return self.name
 
 
+# Postal code centroids (loaded from auctions/data/postal_codes.csv)
+
+class PostalCode(models.Model):
+    code = models.CharField(max_length=3, unique=True)  # Forward sortation area, e.g. P7A
+    place_name = models.CharField(max_length=100, db_index=True)
+    province = models.CharField(max_length=2)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return f"{self.code} ({self.place_name}, {self.province})"
+
+    @staticmethod
+    def normalize(zip_code):
+        return zip_code.replace(' ', '').upper()[:3]
+
+    @classmethod
+    def locate(cls, query):
+        """Find the centroid for a postal code or place name, or None"""
+        query = (query or '').strip()
+        if not query:
+            return None
+        return (
+            cls.objects.filter(code=cls.normalize(query)).first()
+            or cls.objects.filter(place_name__iexact=query).order_by('code').first()
+        )
+
+
+# Columns only ever changed by UPDATE ... SET x = x + n; a full save must not write back a stale copy
+COUNTER_FIELDS = {'unit_count', 'total_weight', 'watcher_count'}
+
+
+def _keep_counters(instance, save_kwargs):
+    if instance._state.adding or save_kwargs.get('update_fields') is not None:
+        return
+    deferred = instance.get_deferred_fields()
+    save_kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+    ]
+
+
+# SMASH - Packages and Sales (LOTs)
+
+class Package(models.Model):
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('CLOSED', 'Closed'),
+        ('SOLD', 'Sold'),
+    ]
+
+    name = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OPEN')
+    final_weight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by auctions/inventory.py as units join and leave
+    unit_count = models.PositiveIntegerField(default=0, editable=False)
+    total_weight = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        _keep_counters(self, kwargs)
+        super().save(*args, **kwargs)
+
+
+class Sale(models.Model):
+    STATUS_CHOICES = [
+        ('DRAFT', 'Draft'),
+        ('ACTIVE', 'Active'),
+        ('CLOSED', 'Closed'),
+        ('SETTLED', 'Settled'),
+    ]
+    SELLER_TYPE_CHOICES = [
+        ('YARD', 'Scrap Yard'),
+        ('SHOP', 'Repair Shop'),
+        ('INDIVIDUAL', 'Individual'),
+    ]
+
+    lot_number = models.CharField(max_length=50, unique=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    packages = models.ManyToManyField(Package, related_name='sales', blank=True)
+    zip_code = models.CharField(max_length=10)
+    # Sums over the sale's packages, maintained by auctions/inventory.py
+    unit_count = models.PositiveIntegerField(default=0, editable=False)
+    total_weight = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    seller_type = models.CharField(max_length=20, choices=SELLER_TYPE_CHOICES)
+    bid_due_date = models.DateTimeField()
+    pickup_instructions = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DRAFT')
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Bounding-box prefilter for radius search
+            models.Index(fields=['latitude', 'longitude']),
+        ]
+
+    def __str__(self):
+        return f"{self.lot_number} - {self.title}"
+
+    def leaderboard(self):
+        """Per-bidder totals over the current high bids in this sale, ranked
+
+        One grouped query: a bid is leading when it equals its product's
+        current_item_bid, which place_bid keeps up to date.
+        """
+        leading = models.Q(amount=models.F('product__current_item_bid'))
+        return (
+            Bid.objects.filter(product__package__sales=self)
+            .values('user_id', 'user__username')
+            .annotate(
+                total=Coalesce(models.Sum('amount', filter=leading), Decimal('0')),
+                units_led=models.Count('pk', filter=leading),
+                units_bid=models.Count('product', distinct=True),
+            )
+            # Rank on a float cast: SQLite can't window-order a NUMERIC-cast aggregate
+            .annotate(rank=models.Window(Rank(), order_by=Cast('total', models.FloatField()).desc()))
+            .order_by('rank', 'user__username')
+        )
+
+    def save(self, *args, **kwargs):
+        centroid = PostalCode.objects.filter(code=PostalCode.normalize(self.zip_code)).first()
+        self.latitude = centroid.latitude if centroid else None
+        self.longitude = centroid.longitude if centroid else None
+        _keep_counters(self, kwargs)
+        super().save(*args, **kwargs)
+
+
 class Product(models.Model):
+    FULLNESS_CHOICES = [
+        ('FULL', 'Full'),
+        ('PARTIAL', 'Partial'),
+        ('EMPTY', 'Empty'),
+    ]
+    APPRAISAL_CATEGORY_CHOICES = [
+        ('OEM', 'OEM'),
+        ('AFTERMARKET', 'Aftermarket'),
+        ('DPF', 'Diesel (DPF)'),
+        ('FOIL', 'Foil'),
+    ]
+
     title = models.CharField(max_length=100)
     description = models.TextField()
     starting_bid = models.DecimalField(max_digits=10, decimal_places=2)
@@ -20,16 +171,56 @@ class Product(models.Model):
     end_time = models.DateTimeField()
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    unique_unit_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Generated by the intake tablet that recorded the unit; re-sent records update it (auctions/intake.py)
+    client_id = models.UUIDField(unique=True, null=True, blank=True, editable=False)
+    package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
+    weight = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, help_text="lbs")
+    is_active = models.BooleanField(default=True)
+    fullness = models.CharField(max_length=10, choices=FULLNESS_CHOICES, blank=True)
+    appraisal_category = models.CharField(max_length=20, choices=APPRAISAL_CATEGORY_CHOICES, blank=True)
+    appraisal_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    starting_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Set by auctions/pricing.py from the metal price index; shown to the seller only
+    suggested_starting_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                                   editable=False)
+    reserve_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Hidden from bidders
+    current_item_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    watcher_count = models.PositiveIntegerField(default=0, editable=False)  # Maintained by auctions/watchlist.py
     objects = InheritanceManager()
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Receivers that keep derived data current (auctions/inventory.py, auctions/unitsearch.py)
+        # compare against these to act only on what a save changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Every edit or bid bumps the version that keys the cached card/detail fragments
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            else:
+                _keep_counters(self, kwargs)
+        super().save(*args, **kwargs)
+        if isinstance(self.version, models.expressions.Combinable):
+            self.refresh_from_db(fields=['version'])
+
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the upload
 
 
 # Specific Product Types
@@ -120,7 +311,92 @@ class Favorite(models.Model):
         unique_together = ('user', 'product')  # Prevent duplicate favorites
 
 
+# Unit ID trigram index (maintained and searched by auctions/unitsearch.py)
+
+class UnitIdTrigram(models.Model):
+    trigram = models.CharField(max_length=3)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='unit_id_trigrams')
+
+    class Meta:
+        # Leads with the trigram so a lookup reads the products sharing it from the index alone
+        unique_together = ('trigram', 'product')
+
+
+class UnitIdTrigramCount(models.Model):
+    """How many units carry a trigram, so lookups can skip the ones every unit ID shares"""
+    trigram = models.CharField(max_length=3, primary_key=True)
+    units = models.PositiveIntegerField(default=0)
+
+
+
+
+
+# Bid rules (compiled by auctions/rules.py)
+
+class BidIncrement(models.Model):
+    """Once the current bid reaches from_amount, the next bid must beat it by at least increment
+
+    Rows without a category form the default table; a category with rows of
+    its own uses only those.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='bid_increments')
+    from_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    increment = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['category', 'from_amount']
+        unique_together = ('category', 'from_amount')
+
+    def __str__(self):
+        return f"{self.category or 'Default'}: +${self.increment} from ${self.from_amount}"
+
+
+class CategoryBidLimit(models.Model):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, related_name='bid_limit')
+    min_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_raise = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                    help_text="Largest amount a bid may exceed the current bid by")
+
+    def __str__(self):
+        return f"Bid limits for {self.category}"
+
+
+# Metal price index (appraisals are recomputed by auctions/pricing.py)
+
+class MetalPrice(models.Model):
+    METAL_CHOICES = [
+        ('PT', 'Platinum'),
+        ('PD', 'Palladium'),
+        ('RH', 'Rhodium'),
+    ]
 
+    metal = models.CharField(max_length=2, choices=METAL_CHOICES)
+    as_of = models.DateField()
+    price_per_ozt = models.DecimalField(max_digits=10, decimal_places=2, help_text="USD per troy ounce")
+
+    class Meta:
+        unique_together = ('metal', 'as_of')
+        ordering = ['metal', '-as_of']
+
+    def __str__(self):
+        return f"{self.get_metal_display()} ${self.price_per_ozt}/ozt on {self.as_of}"
+
+
+class AppraisalFormula(models.Model):
+    """Typical recoverable metal per pound of converter in one appraisal category"""
+    appraisal_category = models.CharField(max_length=20, choices=Product.APPRAISAL_CATEGORY_CHOICES, unique=True)
+    pt_grams_per_lb = models.DecimalField(max_digits=8, decimal_places=4, default=0)
+    pd_grams_per_lb = models.DecimalField(max_digits=8, decimal_places=4, default=0)
+    rh_grams_per_lb = models.DecimalField(max_digits=8, decimal_places=4, default=0)
+    payable = models.DecimalField(max_digits=4, decimal_places=3, default=Decimal('0.850'),
+                                  help_text="Share of the contained metal value that refiners pay out")
+    typical_weight_lbs = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('3.00'))
+    starting_price_ratio = models.DecimalField(max_digits=4, decimal_places=3, default=Decimal('0.600'),
+                                               help_text="Suggested starting price as a share of the unit's value")
+
+    def __str__(self):
+        return f"Appraisal formula for {self.get_appraisal_category_display()}"
 
 
 # Bids
@@ -131,18 +407,142 @@ class Bid(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bids')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bids')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True, related_name='bids')
+    appraisal_category = models.CharField(max_length=20, choices=Product.APPRAISAL_CATEGORY_CHOICES, blank=True)
+    appraisal_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    fullness_applied = models.CharField(max_length=10, choices=Product.FULLNESS_CHOICES, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
 
     def validate_bid(self):
-        if self.product.current_bid is not None:
-            if self.amount <= self.product.current_bid:
-                raise ValidationError({"amount": "Bid must be higher than current bid."})
-            else:
-                if self.amount <= self.product.starting_bid:
-                    raise ValidationError({"amount": "Bid must be higher than starting bid."})
+        """Check the bid against the compiled bid rules and the product's current state"""
+        from .rules import get_bid_rules
+
+        product = self.product
+        error = get_bid_rules().check(
+            self.amount,
+            high=product.current_item_bid,
+            starting_price=product.starting_price,
+            category_id=product.category_id,
+            starting_bid=product.starting_bid,
+        )
+        if error:
+            raise ValidationError({"amount": error})
 
     def clean(self):
-        self.validate_bid()
+        # Skip when clean_fields has already rejected the amount
+        if isinstance(self.amount, Decimal) and self.product_id is not None:
+            self.validate_bid()
+
+
+# Background tasks (see auctions/queue.py)
+
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dequeue order: ready tasks by priority, then age
+            models.Index(fields=['status', '-priority', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class TaskTypeLock(models.Model):
+    """One row per task type with a concurrency cap; claims of the type update it first, one at a time"""
+    name = models.CharField(max_length=100, primary_key=True)
+    claims = models.PositiveBigIntegerField(default=0)
+
+
+# Archive (see auctions/archive.py)
+# Settled sales past their retention window are copied here and removed from the
+# live tables, so listings, indexes and counts only carry open inventory.
+
+class ArchivedSale(models.Model):
+    original_id = models.PositiveIntegerField(unique=True)
+    lot_number = models.CharField(max_length=50, db_index=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    zip_code = models.CharField(max_length=10)
+    unit_count = models.PositiveIntegerField(default=0)
+    total_weight = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    seller_type = models.CharField(max_length=20, choices=Sale.SELLER_TYPE_CHOICES)
+    bid_due_date = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Sale.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-bid_due_date']
+
+    def __str__(self):
+        return f"{self.lot_number} - {self.title} (archived)"
+
+
+class ArchivedProduct(models.Model):
+    is_archived = True
+
+    original_id = models.PositiveIntegerField(unique=True)
+    sale = models.ForeignKey(ArchivedSale, on_delete=models.CASCADE, related_name='products')
+    package_name = models.CharField(max_length=100, blank=True)
+    unique_unit_id = models.CharField(max_length=50, null=True, blank=True, db_index=True)
+    title = models.CharField(max_length=100)
+    description = models.TextField()
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_products')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    fullness = models.CharField(max_length=10, choices=Product.FULLNESS_CHOICES, blank=True)
+    appraisal_category = models.CharField(max_length=20, choices=Product.APPRAISAL_CATEGORY_CHOICES, blank=True)
+    appraisal_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    starting_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    starting_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    current_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    current_item_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)  # Legacy subclass fields
+    created_at = models.DateTimeField()
+    end_time = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedProductImage(models.Model):
+    product = models.ForeignKey(ArchivedProduct, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='product_images/')
+
+
+class ArchivedBid(models.Model):
+    is_archived = True
+
+    original_id = models.PositiveIntegerField(unique=True)
+    product = models.ForeignKey(ArchivedProduct, on_delete=models.CASCADE, related_name='bids')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bids')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    appraisal_category = models.CharField(max_length=20, choices=Product.APPRAISAL_CATEGORY_CHOICES, blank=True)
+    appraisal_value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    fullness_applied = models.CharField(max_length=10, choices=Product.FULLNESS_CHOICES, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
@@ -0,0 +1,250 @@
+# SMASH Marketplace - In-Memory Order Book
+# Scrap Metal Auction Sales Hub
+# File: auctions/orderbook.py
+
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation, ValidationError
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import Bid, Product, Sale
+from .rules import get_bid_rules
+
+
+logger = logging.getLogger(__name__)
+
+BOOK_FIELDS = ('seller_id', 'package_id', 'category_id', 'is_active', 'starting_bid', 'starting_price',
+               'reserve_price', 'current_item_bid', 'version')
+
+BUSY_MESSAGE = "Bidding on this unit is very busy right now, please try again."
+
+
+class OrderBook:
+    """The bidding state of one product, held in process memory
+
+    bids is a min-heap of the top ORDER_BOOK_DEPTH (amount, bid id, user id)
+    entries, so the lowest of them is evicted first as higher bids arrive.
+    sale_ids are the sales listing the product's package, whose cached pages
+    an accepted bid drops.
+    """
+
+    def __init__(self, product_id, row, sale_ids=()):
+        self.product_id = product_id
+        self.seller_id = row['seller_id']
+        self.package_id = row['package_id']
+        self.category_id = row['category_id']
+        self.is_active = row['is_active']
+        self.starting_bid = row['starting_bid']
+        self.starting_price = row['starting_price']
+        self.reserve_price = row['reserve_price']
+        self.high = row['current_item_bid']
+        self.version = row['version']
+        self.sale_ids = tuple(sale_ids)
+        self.bids = []
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def check(self, amount, user_id):
+        """Why this bid can't be accepted in the book's state, or None if it can"""
+        if not self.is_active:
+            return "This unit is no longer accepting bids."
+        if user_id == self.seller_id:
+            return "You cannot bid on your own product."
+        return get_bid_rules().check(
+            amount, high=self.high, starting_price=self.starting_price, category_id=self.category_id,
+            starting_bid=self.starting_bid,
+        )
+
+    def push(self, amount, bid_id, user_id):
+        entry = (amount, bid_id, user_id)
+        if len(self.bids) < settings.ORDER_BOOK_DEPTH:
+            heapq.heappush(self.bids, entry)
+        elif entry > self.bids[0]:
+            heapq.heapreplace(self.bids, entry)
+
+    def record(self, bid, version):
+        with self.lock:
+            # Concurrent accepts can finish out of order; only a newer version moves the book
+            if version > self.version:
+                self.high = bid.amount
+                self.version = version
+            self.push(bid.amount, bid.pk, bid.user_id)
+
+    def top(self):
+        """Highest bids first"""
+        return sorted(self.bids, reverse=True)
+
+    @property
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+
+class OrderBooks:
+    """Order books for active products, loaded in bulk at startup or one by one on first bid
+
+    Bid rules are evaluated against the book alone. The write that follows
+    is conditional on the product's version still being the one the book
+    saw, so a bid accepted by a stale book (another process took a bid, or
+    the product was edited) is never saved; the book is reloaded and the bid
+    re-evaluated instead. Rejections from books older than
+    ORDER_BOOK_MAX_AGE are also rechecked against a fresh load.
+    """
+
+    def __init__(self):
+        self.books = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, product_id):
+        """The product's book, loading it if needed; None if there is no such product"""
+        with self.lock:
+            book = self.books.get(product_id)
+            if book is not None:
+                self.books.move_to_end(product_id)
+                return book
+        return self.reload(product_id)
+
+    def reload(self, product_id):
+        row = (
+            Product.objects.filter(pk=product_id)
+            .values(*BOOK_FIELDS)
+            .first()
+        )
+        if row is None:
+            self.discard(product_id)
+            return None
+        book = OrderBook(product_id, row, _sale_ids([row['package_id']]).get(row['package_id'], ()))
+        bids = (
+            Bid.objects.filter(product_id=product_id)
+            .order_by('-amount', 'pk')
+            .values_list('amount', 'pk', 'user_id')[:settings.ORDER_BOOK_DEPTH]
+        )
+        for amount, bid_id, user_id in bids:
+            book.push(amount, bid_id, user_id)
+        self._store([book])
+        return book
+
+    def hydrate(self):
+        """Load every active product's book in three queries; returns how many were loaded"""
+        rows = list(
+            Product.objects.filter(is_active=True).values('pk', *BOOK_FIELDS)[:settings.ORDER_BOOK_MAX_PRODUCTS]
+        )
+        sale_ids = _sale_ids({row['package_id'] for row in rows})
+        books = {row['pk']: OrderBook(row['pk'], row, sale_ids.get(row['package_id'], ())) for row in rows}
+        top_bids = (
+            Bid.objects.filter(product_id__in=list(books))
+            .annotate(position=Window(RowNumber(), partition_by='product_id', order_by=[F('amount').desc(), 'pk']))
+            .filter(position__lte=settings.ORDER_BOOK_DEPTH)
+            .values_list('product_id', 'amount', 'pk', 'user_id')
+        )
+        for product_id, amount, bid_id, user_id in top_bids:
+            books[product_id].push(amount, bid_id, user_id)
+        self._store(books.values())
+        return len(books)
+
+    def discard(self, product_id):
+        with self.lock:
+            self.books.pop(product_id, None)
+
+    def discard_packages(self, package_ids):
+        """Drop the books of units in these packages, e.g. when their sale listings change"""
+        package_ids = set(package_ids)
+        with self.lock:
+            for product_id in [pk for pk, book in self.books.items() if book.package_id in package_ids]:
+                del self.books[product_id]
+
+    def place(self, bid):
+        """Save an unsaved bid if the bid rules accept it, else raise ValidationError
+
+        Losing bids are turned away by the book without touching the
+        database; an accepted one costs one conditional UPDATE and the
+        INSERT, retried against a reloaded book if another bid won the race.
+        """
+        book = self.get(bid.product_id)
+        for attempt in range(settings.ORDER_BOOK_RETRIES):
+            if book is None:
+                raise ValidationError("This unit no longer exists.")
+            error = book.check(bid.amount, bid.user_id)
+            if error and attempt == 0 and book.age > settings.ORDER_BOOK_MAX_AGE:
+                book = self.reload(bid.product_id)
+                continue
+            if error:
+                raise ValidationError(error)
+
+            with transaction.atomic():
+                updated = (
+                    Product.objects.filter(pk=bid.product_id, version=book.version, is_active=True)
+                    .exclude(seller_id=bid.user_id)
+                    .update(current_item_bid=bid.amount, version=F('version') + 1)
+                )
+                if updated:
+                    bid.package_id = book.package_id
+                    bid.save()
+            if updated:
+                book.record(bid, book.version + 1)
+                return bid
+            # Another bid or an edit got there first; judge the bid again on the new state
+            book = self.reload(bid.product_id)
+        raise ValidationError(BUSY_MESSAGE)
+
+    def _store(self, books):
+        with self.lock:
+            for book in books:
+                self.books[book.product_id] = book
+                self.books.move_to_end(book.product_id)
+            while len(self.books) > settings.ORDER_BOOK_MAX_PRODUCTS:
+                self.books.popitem(last=False)
+
+
+order_books = OrderBooks()
+
+
+def _sale_ids(package_ids):
+    """{package id: ids of the sales listing it}"""
+    listings = {}
+    package_ids = [pk for pk in package_ids if pk is not None]
+    if package_ids:
+        for package_id, sale_id in Sale.packages.through.objects.filter(package_id__in=package_ids).values_list(
+            'package_id', 'sale_id'
+        ):
+            listings.setdefault(package_id, []).append(sale_id)
+    return listings
+
+
+@receiver(m2m_changed, sender=Sale.packages.through, dispatch_uid='auctions.orderbook.listing_changed')
+def listing_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Books elsewhere keep their sale ids until reloaded; pages they miss expire with HOT_PAGE_CACHE_TIMEOUT
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        order_books.discard_packages([instance.pk])
+    elif pk_set:
+        order_books.discard_packages(pk_set)
+    else:
+        with order_books.lock:
+            order_books.books.clear()  # A cleared sale no longer knows which packages it had
+
+
+def hydrate_on_startup():
+    """Compile the bid rules and load the books before the first request
+
+    Called from the WSGI/ASGI entry points (see auctionhub/warmup.py).
+    """
+    try:
+        get_bid_rules()
+        count = order_books.hydrate()
+    except (DatabaseError, SynchronousOnlyOperation):
+        logger.warning('Order books not hydrated; they will load on first bid', exc_info=True)
+    else:
+        logger.info('Hydrated order books for %d active products', count)
+    finally:
+        # Don't hand this connection down to forked server workers
+        connections.close_all()
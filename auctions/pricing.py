@@ -0,0 +1,151 @@
+# SMASH Marketplace - Metal Price Repricing
+# Scrap Metal Auction Sales Hub
+# File: auctions/pricing.py
+
+import logging
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate, product_detail_key
+from .models import AppraisalFormula, MetalPrice, Product
+
+
+logger = logging.getLogger(__name__)
+
+TROY_OUNCE_GRAMS = Decimal('31.1034768')
+CENTS = Decimal('0.01')
+
+# Used for appraisal categories without an AppraisalFormula row:
+# (pt, pd, rh grams per lb, payable share, typical weight in lbs, starting price ratio)
+DEFAULT_FORMULAS = {
+    'OEM': ('0.50', '0.90', '0.10', '0.85', '3.00', '0.60'),
+    'AFTERMARKET': ('0.10', '0.15', '0.01', '0.80', '2.50', '0.50'),
+    'DPF': ('0.60', '0.10', '0', '0.85', '8.00', '0.60'),
+    'FOIL': ('0.15', '0.05', '0.01', '0.75', '1.50', '0.50'),
+}
+
+# Share of a full unit's value left in a partial or emptied shell
+FULLNESS_FACTORS = {
+    'FULL': Decimal('1'),
+    'PARTIAL': Decimal('0.5'),
+    'EMPTY': Decimal('0.05'),
+    '': Decimal('1'),
+}
+
+
+def current_prices():
+    """Latest price per troy ounce of each metal; metals without a price are missing"""
+    prices = {}
+    for metal, price in MetalPrice.objects.order_by('metal', '-as_of').values_list('metal', 'price_per_ozt'):
+        prices.setdefault(metal, price)
+    return prices
+
+
+def missing_metals(prices):
+    """Names of the metals prices has no price for, in METAL_CHOICES order"""
+    return [label for metal, label in MetalPrice.METAL_CHOICES if metal not in prices]
+
+
+def appraisal_formulas():
+    formulas = {
+        category: AppraisalFormula(
+            appraisal_category=category,
+            **dict(zip(
+                ['pt_grams_per_lb', 'pd_grams_per_lb', 'rh_grams_per_lb', 'payable',
+                 'typical_weight_lbs', 'starting_price_ratio'],
+                map(Decimal, values),
+            )),
+        )
+        for category, values in DEFAULT_FORMULAS.items()
+    }
+    formulas.update((formula.appraisal_category, formula) for formula in AppraisalFormula.objects.all())
+    return formulas
+
+
+def appraise(formula, prices, fullness, weight=None):
+    """($/lb appraisal, suggested starting price) for a unit
+
+    The starting price is figured on the unit's own weight in lbs, or on
+    the category's typical weight while it has not been weighed.
+    """
+    grams = {'PT': formula.pt_grams_per_lb, 'PD': formula.pd_grams_per_lb, 'RH': formula.rh_grams_per_lb}
+    per_lb = formula.payable * sum(grams[metal] * prices[metal] for metal in grams) / TROY_OUNCE_GRAMS
+    weight = weight if weight else formula.typical_weight_lbs
+    suggested = per_lb * weight * FULLNESS_FACTORS.get(fullness, Decimal('1')) * formula.starting_price_ratio
+    return per_lb.quantize(CENTS, ROUND_HALF_UP), suggested.quantize(CENTS, ROUND_HALF_UP)
+
+
+def reprice_inventory(batch_size=None, pause=None, units=None):
+    """Re-appraise every active unit (or those in units) against the latest metal prices
+
+    Walks the units in primary key order, batch_size at a time, and writes
+    only the ones whose figures changed, with one bulk_update in its own
+    short transaction per batch, so bids are never held up for long. Yields
+    (units checked, units changed, total) after every batch. Stops early if
+    the prices change mid-run; the run that change schedules takes over.
+    """
+    batch_size = batch_size or settings.REPRICE_BATCH_SIZE
+    pause = settings.REPRICE_PAUSE if pause is None else pause
+    prices = current_prices()
+    missing = missing_metals(prices)
+    if missing:
+        logger.warning('Not repricing: no price yet for %s', ', '.join(missing))
+        return
+    formulas = appraisal_formulas()
+
+    units = (Product.objects.all() if units is None else units).filter(
+        is_active=True, appraisal_category__in=formulas
+    )
+    total = units.count()
+    checked = changed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            units.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'appraisal_category', 'fullness', 'weight', 'appraisal_value', 'suggested_starting_price')
+            [:batch_size]
+        )
+        if not batch:
+            return
+        if current_prices() != prices:
+            logger.info('Metal prices changed during repricing; leaving the rest to the newer run')
+            return
+
+        updates = []
+        for unit in batch:
+            appraisal, suggested = appraise(formulas[unit.appraisal_category], prices, unit.fullness, unit.weight)
+            if (appraisal, suggested) != (unit.appraisal_value, unit.suggested_starting_price):
+                unit.appraisal_value, unit.suggested_starting_price = appraisal, suggested
+                updates.append(unit)
+        if updates:
+            with transaction.atomic():
+                Product.objects.bulk_update(updates, ['appraisal_value', 'suggested_starting_price'])
+            invalidate(*(product_detail_key(unit.pk) for unit in updates))
+
+        checked += len(batch)
+        changed += len(updates)
+        last_pk = batch[-1].pk
+        yield checked, changed, total
+        if pause:
+            time.sleep(pause)
+
+
+def schedule_repricing():
+    """Queue a repricing run unless one is already waiting"""
+    # Imported here: the task module imports this one
+    from .tasks import reprice_products
+    from .models import Task
+
+    if not Task.objects.filter(name=reprice_products.name, status='QUEUED').exists():
+        reprice_products.enqueue()
+
+
+@receiver([post_save, post_delete], sender=MetalPrice, dispatch_uid='auctions.pricing.prices')
+@receiver([post_save, post_delete], sender=AppraisalFormula, dispatch_uid='auctions.pricing.formulas')
+def reprice_on_change(**kwargs):
+    transaction.on_commit(schedule_repricing)
@@ -0,0 +1,17 @@
+# SMASH Marketplace - Process Pool Entry Points
+# Scrap Metal Auction Sales Hub
+# File: auctions/process_worker.py
+#
+# Spawned pool processes unpickle these before Django is configured, so this
+# module must not import models (or anything that does) at import time.
+
+import django
+
+
+def setup():
+    django.setup()
+
+
+def execute_task(pk):
+    from .queue import execute_task
+    return execute_task(pk)
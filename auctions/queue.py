@@ -0,0 +1,199 @@
+# SMASH Marketplace - Background Task Queue
+# Scrap Metal Auction Sales Hub
+# File: auctions/queue.py
+
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Task, TaskTypeLock
+
+
+RETRY_BASE_DELAY = 5  # Seconds before the first retry; doubles on each attempt
+RETRY_MAX_DELAY = 3600
+
+_registry = {}
+_lock_rows = set()  # Task types whose TaskTypeLock row this process has made sure of
+
+
+class TaskType:
+    """A registered task function and its queueing options"""
+
+    def __init__(self, func, name, priority, max_attempts, concurrency):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, priority=None, delay=None, **payload):
+        """Queue a run with JSON-serializable keyword arguments and return immediately"""
+        return Task.objects.create(
+            name=self.name,
+            payload=payload,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_after=timezone.now() + timedelta(seconds=delay or 0),
+        )
+
+
+def task(name=None, priority=0, max_attempts=5, concurrency=None):
+    """Register a function as a background task
+
+    concurrency caps how many runs of this task may be RUNNING at once
+    across all workers.
+    """
+    def decorator(func):
+        task_type = TaskType(func, name or f'{func.__module__}.{func.__name__}', priority, max_attempts, concurrency)
+        _registry[task_type.name] = task_type
+        return task_type
+    return decorator
+
+
+def get_task_type(name):
+    return _registry.get(name)
+
+
+# ============================================
+# WORKER SIDE
+# ============================================
+
+def heartbeat(worker_id, pks):
+    """Refresh locked_at on tasks this worker is still running, so long runs are not requeued"""
+    if not pks:
+        return 0
+    return Task.objects.filter(pk__in=pks, status='RUNNING', locked_by=worker_id).update(
+        locked_at=timezone.now()
+    )
+
+
+def requeue_stale(lock_timeout):
+    """Put RUNNING tasks whose worker stopped sending heartbeats back in the queue"""
+    cutoff = timezone.now() - timedelta(seconds=lock_timeout)
+    return Task.objects.filter(status='RUNNING', locked_at__lt=cutoff).update(
+        status='QUEUED', locked_by='', locked_at=None
+    )
+
+
+def claim_tasks(worker_id, limit):
+    """Claim up to limit ready tasks, honouring priorities and per-type concurrency
+
+    Each claim is a conditional UPDATE, so competing workers can never run
+    the same task twice, on any database backend. Claims of a task type with
+    a concurrency cap also recount its RUNNING tasks under the type's
+    TaskTypeLock row, so workers claiming at once cannot pass the cap
+    together.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    running = dict(
+        Task.objects.filter(status='RUNNING').values_list('name').annotate(count=Count('pk'))
+    )
+    saturated = [
+        name for name, task_type in _registry.items()
+        if task_type.concurrency is not None and running.get(name, 0) >= task_type.concurrency
+    ]
+    candidates = (
+        Task.objects.filter(status='QUEUED', run_after__lte=now)
+        .exclude(name__in=saturated)
+        .order_by('-priority', 'run_after', 'pk')
+        .values_list('pk', 'name')[:limit * 4]
+    )
+
+    claimed = []
+    for pk, name in candidates:
+        task_type = _registry.get(name)
+        if task_type is not None and task_type.concurrency is not None:
+            if running.get(name, 0) >= task_type.concurrency:
+                continue
+            updated, running[name] = _claim_capped(pk, task_type, worker_id, now)
+        else:
+            updated = _claim(pk, worker_id, now)
+            running[name] = running.get(name, 0) + updated
+        if updated:
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def _claim(pk, worker_id, now):
+    return Task.objects.filter(pk=pk, status='QUEUED').update(
+        status='RUNNING', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+    )
+
+
+def _claim_capped(pk, task_type, worker_id, now):
+    """Claim one task of a capped type -> (claimed, RUNNING count of the type after it)"""
+    name = task_type.name
+    if name not in _lock_rows:
+        TaskTypeLock.objects.bulk_create([TaskTypeLock(name=name)], ignore_conflicts=True)
+        _lock_rows.add(name)
+    with transaction.atomic():
+        # Writing the lock row first holds off other claims of this type (row lock, or
+        # SQLite's write lock) until this transaction ends, so the count below stays true
+        TaskTypeLock.objects.filter(name=name).update(claims=F('claims') + 1)
+        running = Task.objects.filter(name=name, status='RUNNING').count()
+        if running >= task_type.concurrency:
+            return False, running
+        updated = _claim(pk, worker_id, now)
+    return bool(updated), running + updated
+
+
+def execute_task(pk):
+    """Run one claimed task and record the outcome; returns the final status"""
+    close_old_connections()
+    try:
+        task_row = Task.objects.get(pk=pk)
+        task_type = get_task_type(task_row.name)
+        try:
+            if task_type is None:
+                raise LookupError(f"No task registered as '{task_row.name}'")
+            task_type.func(**task_row.payload)
+        except Exception:
+            return _record_failure(task_row, traceback.format_exc())
+        Task.objects.filter(pk=pk).update(
+            status='DONE', finished_at=timezone.now(), locked_by='', locked_at=None, last_error=''
+        )
+        return 'DONE'
+    finally:
+        close_old_connections()
+
+
+def _record_failure(task_row, error):
+    if task_row.attempts < task_row.max_attempts:
+        delay = min(RETRY_BASE_DELAY * 2 ** (task_row.attempts - 1), RETRY_MAX_DELAY)
+        delay *= random.uniform(0.8, 1.2)  # Jitter so failed batches don't retry in lockstep
+        Task.objects.filter(pk=task_row.pk).update(
+            status='QUEUED', run_after=timezone.now() + timedelta(seconds=delay),
+            locked_by='', locked_at=None, last_error=error,
+        )
+        return 'RETRY'
+    Task.objects.filter(pk=task_row.pk).update(
+        status='FAILED', finished_at=timezone.now(), locked_by='', locked_at=None, last_error=error
+    )
+    return 'FAILED'
+
+
+def queue_stats():
+    """Queue depth per task name and status in one grouped query"""
+    now = timezone.now()
+    rows = (
+        Task.objects.filter(status__in=['QUEUED', 'RUNNING'])
+        .values('name')
+        .annotate(
+            ready=Count('pk', filter=Q(status='QUEUED', run_after__lte=now)),
+            delayed=Count('pk', filter=Q(status='QUEUED', run_after__gt=now)),
+            running=Count('pk', filter=Q(status='RUNNING')),
+        )
+        .order_by('name')
+    )
+    return list(rows)
@@ -0,0 +1,98 @@
+# SMASH Marketplace - Bid Rule Engine
+# Scrap Metal Auction Sales Hub
+# File: auctions/rules.py
+
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BidIncrement, CategoryBidLimit
+
+
+# With no increment table at all, a bid only has to beat the current one by a cent
+MINIMUM_STEP = Decimal('0.01')
+
+
+class CompiledBidRules:
+    """Increment tables and category limits, flattened for lookups without queries
+
+    Each increment table becomes two parallel sorted lists, so finding the
+    tier for a price is a bisect rather than a scan.
+    """
+
+    def __init__(self, increments, limits):
+        tables = {}
+        for row in increments:
+            tables.setdefault(row.category_id, []).append((row.from_amount, row.increment))
+        self.tables = {
+            category_id: ([start for start, _ in sorted(rows)], [step for _, step in sorted(rows)])
+            for category_id, rows in tables.items()
+        }
+        self.limits = {limit.category_id: limit for limit in limits}
+        self.compiled_at = time.monotonic()
+
+    def increment(self, current, category_id=None):
+        starts, steps = self.tables.get(category_id) or self.tables.get(None) or ((), ())
+        tier = bisect_right(starts, current) - 1
+        return steps[tier] if tier >= 0 else MINIMUM_STEP
+
+    def minimum_bid(self, high, starting_price, category_id=None, starting_bid=None):
+        """The lowest amount the next bid may be
+
+        An opening bid must reach both the advertised starting bid and the
+        seller's starting price, whichever is higher.
+        """
+        if high is not None:
+            return high + self.increment(high, category_id)
+        limit = self.limits.get(category_id)
+        floors = [starting_bid, starting_price, limit and limit.min_bid, MINIMUM_STEP]
+        return max(floor for floor in floors if floor is not None)
+
+    def check(self, amount, *, high, starting_price, category_id=None, starting_bid=None):
+        """Why this bid breaks the rules, or None if it is acceptable"""
+        if amount <= 0:
+            return "Bid must be a positive amount."
+        minimum = self.minimum_bid(high, starting_price, category_id, starting_bid)
+        if amount < minimum:
+            if high is None:
+                return f"Bid must be at least ${minimum}."
+            return f"Bid must be at least ${minimum} (the current bid plus a ${minimum - high} increment)."
+        limit = self.limits.get(category_id)
+        if limit is not None:
+            if limit.max_bid is not None and amount > limit.max_bid:
+                return f"Bids in this category are limited to ${limit.max_bid}."
+            if limit.max_raise is not None and high is not None and amount - high > limit.max_raise:
+                return f"A bid may raise the current bid by at most ${limit.max_raise} in this category."
+        return None
+
+    @staticmethod
+    def reserve_met(amount, reserve_price):
+        return reserve_price is None or amount >= reserve_price
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def get_bid_rules():
+    """This process's compiled rules, rebuilt when edited here or older than BID_RULES_TTL"""
+    global _rules
+    rules = _rules
+    if rules is None or time.monotonic() - rules.compiled_at > settings.BID_RULES_TTL:
+        with _rules_lock:
+            if _rules is rules:
+                _rules = CompiledBidRules(BidIncrement.objects.all(), CategoryBidLimit.objects.all())
+            rules = _rules
+    return rules
+
+
+@receiver([post_save, post_delete], sender=BidIncrement, dispatch_uid='auctions.rules.increments')
+@receiver([post_save, post_delete], sender=CategoryBidLimit, dispatch_uid='auctions.rules.limits')
+def invalidate_bid_rules(**kwargs):
+    global _rules
+    _rules = None
@@ -0,0 +1,36 @@
+# SMASH Marketplace - Background Tasks
+# Scrap Metal Auction Sales Hub
+# File: auctions/tasks.py
+
+import logging
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .models import ProductImage
+from .pricing import reprice_inventory
+from .queue import task
+
+
+logger = logging.getLogger(__name__)
+
+
+@task(concurrency=2)
+def process_product_image(image_id):
+    """Apply EXIF orientation and shrink an uploaded converter photo in place"""
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None:
+        return
+    path = product_image.image.path
+    with Image.open(path) as img:
+        image_format = img.format
+        processed = ImageOps.exif_transpose(img)
+        processed.thumbnail((settings.PRODUCT_IMAGE_MAX_SIZE, settings.PRODUCT_IMAGE_MAX_SIZE))
+        processed.save(path, format=image_format)
+
+
+@task(concurrency=1)
+def reprice_products():
+    """Re-appraise active units after metal prices or appraisal formulas change"""
+    for checked, changed, total in reprice_inventory():
+        logger.info('Repriced %d of %d units (%d changed)', checked, total, changed)
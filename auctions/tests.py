@@ -1,3 +1,92 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .facets import facet_cache_key
+from .models import Bid, Category, Package, Product, Sale
+
+
+class SaleLeaderboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user('seller', password='password')
+        cls.buyer = User.objects.create_user('buyer', password='password')
+        cls.buyer2 = User.objects.create_user('buyer2', password='password')
+        category = Category.objects.create(name='Converters')
+        package = Package.objects.create(name='Batch 1')
+        cls.sale = Sale.objects.create(
+            lot_number='LOT-1', title='Thunder Bay', zip_code='P7A1A1', seller_type='YARD',
+            bid_due_date=timezone.now() + timedelta(days=2), status='ACTIVE',
+        )
+        cls.sale.packages.add(package)
+        for i, (user, amounts) in enumerate([
+            (cls.buyer, ['250.10', '285.52']),
+            (cls.buyer2, ['300.25']),
+        ]):
+            for j, amount in enumerate(amounts):
+                product = Product.objects.create(
+                    title=f'Cat {i}-{j}', description='d', starting_bid=Decimal('10'),
+                    end_time=timezone.now() + timedelta(days=1), seller=seller, category=category,
+                    unique_unit_id=f'CAT-{i}-{j}', package=package,
+                )
+                Bid.objects.create(product=product, user=user, amount=Decimal(amount), package=package)
+                Product.objects.filter(pk=product.pk).update(current_item_bid=Decimal(amount))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_totals_rank_bidders_with_two_decimal_places(self):
+        rows = list(self.sale.leaderboard())
+        self.assertEqual([row['user__username'] for row in rows], ['buyer', 'buyer2'])
+        self.assertEqual([row['total'] for row in rows], [Decimal('535.62'), Decimal('300.25')])
+        self.assertEqual([row['rank'] for row in rows], [1, 2])
+
+    def test_sale_page_shows_totals_as_money(self):
+        response = self.client.get(reverse('sale_detail', args=[self.sale.pk]))
+        self.assertContains(response, '<td>$535.62</td>', html=True)
+        self.assertContains(response, '<td>$300.25</td>', html=True)
+        self.assertNotContains(response, '535.620')
+
+
+class ProductFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user('seller', password='password')
+        oem = Category.objects.create(name='OEM Converters')
+        foil = Category.objects.create(name='Foil')
+        units = [('FULL', oem)] * 3 + [('PARTIAL', oem)] * 2 + [('EMPTY', foil)]
+        for i, (fullness, category) in enumerate(units):
+            Product.objects.create(
+                title=f'Cat {i}', description='d', starting_bid=Decimal('10'),
+                end_time=timezone.now() + timedelta(days=1), seller=seller, category=category,
+                unique_unit_id=f'CAT-{i}', fullness=fullness,
+            )
+        cls.oem, cls.foil = oem, foil
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, facet, **params):
+        response = self.client.get(reverse('product_list'), params)
+        return {option['value']: option['count'] for option in response.context['facets'][facet]}
+
+    def test_selected_facet_keeps_counting_its_other_options(self):
+        self.assertEqual(self.counts('fullness', fullness='FULL'), {'FULL': 3, 'PARTIAL': 2, 'EMPTY': 1})
+
+    def test_other_facets_follow_the_selection(self):
+        counts = self.counts('category', fullness='PARTIAL')
+        self.assertEqual(counts, {self.oem.name: 2, self.foil.name: 0})
+        self.assertEqual(self.counts('fullness', fullness='FULL', category=self.foil.name),
+                         {'FULL': 0, 'PARTIAL': 0, 'EMPTY': 1})
 
-# Create your tests here.
+    def test_cache_key_ignores_case_only_where_matching_does(self):
+        self.assertEqual(facet_cache_key({'category': 'Foil', 'search': 'CAT'}),
+                         facet_cache_key({'category': 'foil', 'search': 'cat'}))
+        self.assertNotEqual(facet_cache_key({'fullness': 'FULL'}), facet_cache_key({'fullness': 'full'}))
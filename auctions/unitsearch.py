@@ -0,0 +1,171 @@
+# SMASH Marketplace - Typo-Tolerant Unit ID Lookup
+# Scrap Metal Auction Sales Hub
+# File: auctions/unitsearch.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, UnitIdTrigram, UnitIdTrigramCount
+
+
+# Characters scanners and yard staff mix up on stamped or worn labels are
+# indexed as one, so CAT-2O25-OO1 still shares every trigram with CAT-2025-001
+CONFUSABLE = str.maketrans('OQDILSBZG', '000115826')
+
+
+def normalize(unit_id):
+    """Upper case, letters that read as digits folded together, separators dropped"""
+    return ''.join(ch for ch in (unit_id or '').upper().translate(CONFUSABLE) if ch.isalnum())
+
+
+def trigrams(unit_id):
+    """Padded three-character windows, as pg_trgm takes them (two blanks before, one after)"""
+    padded = f'  {normalize(unit_id)} '
+    if len(padded) == 3:
+        return set()
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Shared trigrams over all trigrams of either, from 0 to 1"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ============================================
+# INDEX
+# ============================================
+
+def _count(grams, change):
+    if not grams:
+        return
+    UnitIdTrigramCount.objects.bulk_create(
+        [UnitIdTrigramCount(trigram=gram) for gram in grams], ignore_conflicts=True
+    )
+    UnitIdTrigramCount.objects.filter(trigram__in=grams).update(units=F('units') + change)
+
+
+def index_units(units):
+    """(pk, unique_unit_id) pairs -> rewrite those units' trigrams and the per-trigram counts"""
+    wanted = {pk: trigrams(unit_id) for pk, unit_id in units}
+    if not wanted:
+        return
+    with transaction.atomic():
+        existing = {}
+        for pk, gram in UnitIdTrigram.objects.filter(product__in=wanted).values_list('product', 'trigram'):
+            existing.setdefault(pk, set()).add(gram)
+        added, removed, rows = {}, {}, []
+        for pk, grams in wanted.items():
+            old = existing.get(pk, set())
+            for gram in grams - old:
+                added[gram] = added.get(gram, 0) + 1
+                rows.append(UnitIdTrigram(trigram=gram, product_id=pk))
+            stale = old - grams
+            if stale:
+                UnitIdTrigram.objects.filter(product=pk, trigram__in=stale).delete()
+                for gram in stale:
+                    removed[gram] = removed.get(gram, 0) + 1
+        UnitIdTrigram.objects.bulk_create(rows, batch_size=1000)
+        # Grouped by how much each count moves, usually a single UPDATE per direction
+        for counts, sign in ((added, 1), (removed, -1)):
+            by_change = {}
+            for gram, n in counts.items():
+                by_change.setdefault(n, set()).add(gram)
+            for n, grams in by_change.items():
+                _count(grams, sign * n)
+
+
+def rebuild_index(batch_size=1000):
+    """Reindex every unit from scratch; yields (units indexed, total) per batch"""
+    total = Product.objects.count()
+    with transaction.atomic():
+        UnitIdTrigram.objects.all().delete()
+        UnitIdTrigramCount.objects.all().delete()
+    indexed = last_pk = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'unique_unit_id')[:batch_size]
+        )
+        if not batch:
+            return
+        index_units(batch)
+        indexed += len(batch)
+        last_pk = batch[-1][0]
+        yield indexed, total
+
+
+@receiver(post_save, dispatch_uid='auctions.unitsearch.unit_saved')
+def unit_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not isinstance(instance, Product):
+        return
+    if update_fields is not None and 'unique_unit_id' not in update_fields:
+        return
+    unit_id = instance.__dict__.get('unique_unit_id')
+    loaded = getattr(instance, '_loaded_values', {})
+    if not created and 'unique_unit_id' in loaded and loaded['unique_unit_id'] == unit_id:
+        return
+    index_units([(instance.pk, unit_id)])
+    instance._loaded_values = {**loaded, 'unique_unit_id': unit_id}
+
+
+@receiver(post_delete, dispatch_uid='auctions.unitsearch.unit_deleted')
+def unit_deleted(sender, instance, **kwargs):
+    # The trigram rows go with the unit (on_delete=CASCADE); the counts are ours to take down
+    if sender is not Product or 'unique_unit_id' not in instance.__dict__:
+        return  # A deferred ID can no longer be read; rebuild_index recounts
+    _count(trigrams(instance.unique_unit_id), -1)
+
+
+# ============================================
+# LOOKUP
+# ============================================
+
+def lookup(query, limit=10, threshold=None):
+    """Units whose ID best matches query, best first, as (product, similarity) pairs
+
+    An exact ID is answered from the unique index alone. Otherwise candidates
+    are the units sharing the query's rarest trigrams, read from the trigram
+    index with at most UNIT_LOOKUP_CANDIDATES rows scanned, then ranked by
+    trigram similarity and cut at threshold (UNIT_LOOKUP_THRESHOLD).
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    exact = Product.objects.filter(unique_unit_id=query).first()
+    if exact is not None:
+        return [(exact, 1.0)]
+
+    wanted = trigrams(query)
+    if not wanted:
+        return []
+    threshold = settings.UNIT_LOOKUP_THRESHOLD if threshold is None else threshold
+    counts = dict(UnitIdTrigramCount.objects.filter(trigram__in=wanted, units__gt=0).values_list('trigram', 'units'))
+    # Rarest first, until the rows to scan would pass the budget. Prefixes every
+    # unit shares (CAT, 202...) are left out; they cannot tell units apart anyway
+    selected, scanned = [], 0
+    for gram in sorted(counts, key=counts.get):
+        if selected and scanned + counts[gram] > settings.UNIT_LOOKUP_CANDIDATES:
+            break
+        selected.append(gram)
+        scanned += counts[gram]
+    if not selected:
+        return []
+
+    # Many units tie on the rare trigrams alone (every prefix with the same serial),
+    # so a generous pool goes on to be scored on all of them
+    candidates = list(
+        UnitIdTrigram.objects.filter(trigram__in=selected).values('product')
+        .annotate(shared=Count('trigram')).order_by('-shared').values_list('product', flat=True)[:limit * 20]
+    )
+    ranked = []
+    for product in Product.objects.filter(pk__in=candidates).select_related('package'):
+        score = similarity(wanted, trigrams(product.unique_unit_id))
+        if score >= threshold:
+            ranked.append((product, score))
+    ranked.sort(key=lambda match: (-match[1], match[0].unique_unit_id or ''))
+    return ranked[:limit]
@@ -0,0 +1,85 @@
+# SMASH Marketplace - Photo Uploads
+# Scrap Metal Auction Sales Hub
+# File: auctions/uploads.py
+
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from .models import ProductImage
+from .tasks import process_product_image
+
+
+IMAGE_DIR = 'product_images'
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Streams every upload to a temporary file, hashing each chunk as it arrives
+
+    Nothing is held in memory beyond one chunk, and the finished file knows
+    its SHA-256 without being read a second time.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+def content_hash(file):
+    """SHA-256 of an uploaded file, from the upload handler when it already has it"""
+    if getattr(file, 'content_hash', None):
+        return file.content_hash
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def image_name(digest, filename):
+    """Storage name for a photo: identical content always maps to the same file"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f'{IMAGE_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def save_product_images(product, files):
+    """Store uploaded photos once per distinct content and add them to the product
+
+    Photos the product already has, or that repeat within the upload, are
+    skipped. Files already in storage (another product has the same photo)
+    are reused instead of written again. Returns the new ProductImage rows.
+    """
+    uploads = {}
+    for file in files:
+        uploads.setdefault(content_hash(file), file)
+    existing = set(
+        ProductImage.objects.filter(product=product, content_hash__in=uploads).values_list('content_hash', flat=True)
+    )
+
+    images, stored = [], []
+    for digest, file in uploads.items():
+        if digest in existing:
+            continue
+        name = image_name(digest, file.name)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, file)
+            stored.append(name)
+        images.append(ProductImage(product=product, image=name, content_hash=digest))
+    images = ProductImage.objects.bulk_create(images)
+
+    # Only newly written files need resizing; reused ones were processed when first stored
+    for image in images:
+        if image.image.name in stored:
+            process_product_image.enqueue(image_id=image.pk)
+    return images
@@ -3,25 +3,38 @@
 # File: auctions/urls.py
 # REPLACE your existing urls.py with this complete file
 
+from django.conf import settings
 from django.urls import path
 from .views import (
     ProductListView, ProductDetailView, CategorySelectView,
     ProductCreateView, ProductUpdateView, ProductDeleteView,
-    place_bid, SaleListView, SaleDetailView
+    unit_lookup, product_sync, place_bid, toggle_favorite, watchlist_add, watchlist_remove, SaleListView, SaleDetailView,
+    AsyncProductListView, AsyncProductDetailView
 )
 
+# Under ASGI the read-heavy product pages are served by their async versions
+product_list_view = AsyncProductListView if settings.ASYNC_VIEWS else ProductListView
+product_detail_view = AsyncProductDetailView if settings.ASYNC_VIEWS else ProductDetailView
+
 urlpatterns = [
     # Product (Catalytic Converter) URLs
-    path('products/', ProductListView.as_view(), name='product_list'),
-    path('products/<int:pk>/', ProductDetailView.as_view(), name='product_detail'),
+    path('products/', product_list_view.as_view(), name='product_list'),
+    path('products/<int:pk>/', product_detail_view.as_view(), name='product_detail'),
     path('products/create/', CategorySelectView.as_view(), name='product_create'),
     path('products/create/<str:category>/', ProductCreateView.as_view(), name='product_create_with_category'),
     path('products/<int:pk>/edit/', ProductUpdateView.as_view(), name='product_edit'),
     path('products/<int:pk>/delete/', ProductDeleteView.as_view(), name='product_delete'),
+    path('products/lookup/', unit_lookup, name='unit_lookup'),
+    path('products/sync/', product_sync, name='product_sync'),
     
     # Bidding URLs
     path('products/<int:pk>/bid/', place_bid, name='place_bid'),
     
+    # Watchlist URLs
+    path('products/<int:pk>/favorite/', toggle_favorite, name='toggle_favorite'),
+    path('watchlist/add/', watchlist_add, name='watchlist_add'),
+    path('watchlist/remove/', watchlist_remove, name='watchlist_remove'),
+    
     # Sale (LOT) URLs
     path('sales/', SaleListView.as_view(), name='sale_list'),
     path('sales/<int:pk>/', SaleDetailView.as_view(), name='sale_detail'),
@@ -3,62 +3,108 @@
 # File: auctions/views.py
 # REPLACE your existing views.py with this complete file
 
+import asyncio
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, TemplateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import InvalidPage
+from django.db import DatabaseError, IntegrityError
 from django.db.models import Q
-from .models import Product, Sale, Category, Package, Bid, ProductImage
+from .models import Product, Sale, Category, Package, Bid, PostalCode
 from .forms import ProductForm, BidForm, PackageForm, SaleForm
+from .cache import (
+    get_or_compute, aget_or_compute, invalidate_product,
+    product_detail_key, sale_detail_key, sale_leaderboard_key
+)
+from .geo import within_radius
+from .facets import FACETS, facet_cache_key, facet_counts, facet_options, filter_price_bucket
+from .uploads import save_product_images
+from .intake import listing_defaults, sync_products
+from .instrumentation import BID_SECONDS, BIDS, InstrumentedViewMixin
+from .orderbook import BUSY_MESSAGE, order_books
+from .rules import get_bid_rules
+from .unitsearch import lookup
+from .watchlist import watch, watched_ids, unwatch
+
+
+DEFAULT_SEARCH_RADIUS_KM = 100
 
 
 # ============================================
 # PRODUCT (CATALYTIC CONVERTER) VIEWS
 # ============================================
 
-class ProductListView(ListView):
+class ProductListView(InstrumentedViewMixin, ListView):
     """List all catalytic converters with filters"""
+    metrics_name = 'product_list'
     model = Product
     template_name = 'auctions/product_list.html'
     context_object_name = 'products'
     paginate_by = 20
     
     def get_queryset(self):
+        queryset = self.filter_products()
+        
+        # Sort
+        sort = self.request.GET.get('sort')
+        if sort == 'price_asc':
+            queryset = queryset.order_by('current_item_bid')
+        elif sort == 'price_desc':
+            queryset = queryset.order_by('-current_item_bid')
+        elif sort == 'unit_id':
+            queryset = queryset.order_by('unique_unit_id')
+        else:
+            queryset = queryset.order_by('-created_at')
+        
+        return queryset
+    
+    def filter_products(self, skip=None):
+        """Active units matching the request's filters, leaving out the one for the facet named skip"""
         queryset = Product.objects.filter(is_active=True)
+        params = {name: value for name, value in self.request.GET.items() if name != skip}
         
         # Filter by category
-        category = self.request.GET.get('category')
+        category = params.get('category')
         if category:
             queryset = queryset.filter(category__name__iexact=category)
         
         # Filter by package
-        package_id = self.request.GET.get('package')
+        package_id = params.get('package')
         if package_id:
             queryset = queryset.filter(package__id=package_id)
         
-        # Filter by price range
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
+        # Filter by appraisal category and fullness
+        appraisal_category = params.get('appraisal_category')
+        if appraisal_category:
+            queryset = queryset.filter(appraisal_category=appraisal_category)
+        fullness = params.get('fullness')
+        if fullness:
+            queryset = queryset.filter(fullness=fullness)
+        
+        # Filter by price bucket (from the sidebar facets) or range
+        price_bucket = params.get('price_bucket')
+        if price_bucket:
+            queryset = filter_price_bucket(queryset, price_bucket)
+        min_price = params.get('min_price')
+        max_price = params.get('max_price')
         if min_price:
             queryset = queryset.filter(current_item_bid__gte=float(min_price))
         if max_price:
             queryset = queryset.filter(current_item_bid__lte=float(max_price))
         
-        # Sort
-        sort = self.request.GET.get('sort')
-        if sort == 'price_asc':
-            queryset = queryset.order_by('current_item_bid')
-        elif sort == 'price_desc':
-            queryset = queryset.order_by('-current_item_bid')
-        elif sort == 'unit_id':
-            queryset = queryset.order_by('unique_unit_id')
-        else:
-            queryset = queryset.order_by('-created_at')
-        
         # Search
-        search_query = self.request.GET.get('search')
+        search_query = params.get('search')
         if search_query:
             queryset = queryset.filter(
                 Q(title__icontains=search_query) | 
@@ -70,29 +116,70 @@ class ProductListView(ListView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['packages'] = Package.objects.all()
+        context['categories'] = list(Category.objects.all())
+        context['packages'] = list(Package.objects.all())
         context['search_query'] = self.request.GET.get('search', '')
+        context['facets'] = facet_options(self.get_facet_counts(), context['categories'], context['packages'])
+        context['watched_ids'] = watched_ids(self.request.user)
         return context
+    
+    def get_facet_counts(self):
+        """Sidebar counts for the current filters, shared across requests with the same filters
 
+        A facet with an option selected is counted without its own filter, so
+        picking one option doesn't zero out the others.
+        """
+        selected = [facet for facet in FACETS if self.request.GET.get(facet)]
+        return get_or_compute(
+            facet_cache_key(self.request.GET),
+            lambda: facet_counts(self.object_list, {facet: self.filter_products(skip=facet) for facet in selected}),
+            settings.FACET_CACHE_TIMEOUT,
+        )
 
-class ProductDetailView(DetailView):
+
+class ProductDetailView(InstrumentedViewMixin, DetailView):
     """Detail view for a single catalytic converter"""
+    metrics_name = 'product_detail'
     model = Product
     template_name = 'auctions/product_detail.html'
     context_object_name = 'product'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        product = self.get_object()
+    def get_queryset(self):
+        # The page shows the seller and category; the build is cached with them loaded
+        return Product.objects.select_related('category', 'package', 'seller')
+    
+    def get_object(self, queryset=None):
+        # Closing-time viewers share one cached build; bids invalidate it
+        self.detail = get_or_compute(product_detail_key(self.kwargs['pk']), self.build_detail)
+        return self.detail['product']
+    
+    def build_detail(self):
+        product = super().get_object()
         
         # Get all bids on this product
-        context['bids'] = product.bids.all().order_by('-amount')
-        context['bid_count'] = product.bids.count()
-        
+        bids = list(product.bids.all().order_by('-amount'))
+        return {
+            'product': product,
+            'bids': bids,
+            'bid_count': len(bids),
+            'minimum_bid': _minimum_bid(get_bid_rules(), product),
+        }
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bids'] = self.detail['bids']
+        context['bid_count'] = self.detail['bid_count']
+        context['minimum_bid'] = self.detail['minimum_bid']
+        context['is_favorited'] = self.object.pk in watched_ids(self.request.user)
         return context
 
 
+def _minimum_bid(rules, product):
+    return rules.minimum_bid(
+        product.current_item_bid, product.starting_price, product.category_id, product.starting_bid
+    )
+
+
 class CategorySelectView(LoginRequiredMixin, TemplateView):
     """Select category before creating a product"""
     template_name = 'auctions/category_select.html'
@@ -124,12 +211,14 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
     
     def form_valid(self, form):
         form.instance.seller = self.request.user
+        # The form has no listing fields; open at the starting price for the usual listing period
+        for name, value in listing_defaults(form.instance.starting_price).items():
+            if getattr(form.instance, name) is None:
+                setattr(form.instance, name, value)
         product = form.save()
         
-        # Handle image upload
-        image = self.request.FILES.get('image')
-        if image:
-            ProductImage.objects.create(product=product, image=image)
+        # Photos are deduplicated and saved together; resizing runs in the background (see run_workers)
+        save_product_images(product, form.cleaned_data['images'])
         
         messages.success(self.request, f"Catalytic converter {product.unique_unit_id} created successfully!")
         return super().form_valid(form)
@@ -170,7 +259,11 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
     
     def form_valid(self, form):
         messages.success(self.request, "Catalytic converter updated successfully!")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        save_product_images(self.object, form.cleaned_data['images'])
+        invalidate_product(self.object)
+        order_books.discard(self.object.pk)
+        return response
 
 
 class ProductDeleteView(LoginRequiredMixin, DeleteView):
@@ -196,54 +289,212 @@ class ProductDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+@require_GET
+def unit_lookup(request):
+    """Best matches for a scanned or typed unit ID, as JSON, for intake scanners
+
+    ?q= is the label as read; ?limit= caps the matches (default 10, at most 50).
+    An exact ID comes back alone with similarity 1.0.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=403)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    query = request.GET.get('q', '')
+    matches = lookup(query, limit=limit)
+    return JsonResponse({
+        'query': query,
+        'exact': bool(matches) and matches[0][0].unique_unit_id == query.strip(),
+        'matches': [
+            {
+                'id': product.pk,
+                'unique_unit_id': product.unique_unit_id,
+                'title': product.title,
+                'package': product.package.name if product.package else None,
+                'is_active': product.is_active,
+                'similarity': round(score, 3),
+                'url': reverse('product_detail', args=[product.pk]),
+            }
+            for product, score in matches
+        ],
+    })
+
+
+# Content-Encoding -> zlib wbits for the compressed batches intake tablets send
+SYNC_ENCODINGS = {'identity': None, 'gzip': 31, 'deflate': 15}
+
+
+@require_POST
+def product_sync(request):
+    """Create or update a batch of units recorded offline, as JSON, for intake tablets
+
+    The body is {"records": [{"client_id": <uuid>, "unique_unit_id": ..., ...}]},
+    optionally sent with Content-Encoding gzip or deflate. Re-sending a batch is
+    safe: every record comes back with its status (see auctions/intake.py).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Login required'}, status=403)
+    records, error = _read_batch(request)
+    if error:
+        return error
+    try:
+        results = sync_products(request.user, records)
+    except IntegrityError:
+        # Another device synced a clashing record meanwhile; nothing was written
+        return JsonResponse({'error': 'Conflicting sync in progress, send the batch again'}, status=409)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return JsonResponse({'counts': counts, 'results': results})
+
+
+def _read_batch(request):
+    """(records, None), or (None, an error response) when the body is unusable"""
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding not in SYNC_ENCODINGS:
+        return None, JsonResponse({'error': f'Unsupported Content-Encoding {encoding}'}, status=415)
+    body = request.body
+    limit = settings.INTAKE_SYNC_MAX_BYTES
+    if SYNC_ENCODINGS[encoding] is not None:
+        inflater = zlib.decompressobj(SYNC_ENCODINGS[encoding])
+        try:
+            body = inflater.decompress(body, limit + 1)
+        except zlib.error:
+            return None, JsonResponse({'error': f'Body is not valid {encoding} data'}, status=400)
+    if len(body) > limit:
+        return None, JsonResponse({'error': f'Batch is larger than {limit} bytes'}, status=413)
+    try:
+        records = json.loads(body)['records']
+    except (ValueError, TypeError, KeyError):
+        return None, JsonResponse({'error': 'Expected a JSON object with a "records" list'}, status=400)
+    if not isinstance(records, list):
+        return None, JsonResponse({'error': 'Expected a JSON object with a "records" list'}, status=400)
+    if len(records) > settings.INTAKE_SYNC_MAX_RECORDS:
+        return None, JsonResponse(
+            {'error': f'At most {settings.INTAKE_SYNC_MAX_RECORDS} records per batch'}, status=413
+        )
+    return records, None
+
+
 # ============================================
 # BIDDING VIEWS
 # ============================================
 
 def place_bid(request, pk):
-    """Place a bid on a catalytic converter"""
-    product = get_object_or_404(Product, pk=pk)
-    
+    """Place a bid on a catalytic converter
+
+    Bids are checked against the in-memory order book, so a losing bid is
+    turned away without reading the product from the database.
+    """
     # Check authentication
     if not request.user.is_authenticated:
         messages.error(request, "You must be logged in to place bids.")
         return redirect('login')
     
+    book = order_books.get(pk)
+    if book is None:
+        raise Http404("No product found matching the query")
+    
     # Prevent bidding on own product
-    if request.user == product.seller:
+    if request.user.pk == book.seller_id:
         messages.error(request, "You cannot bid on your own product.")
-        return redirect('product_detail', pk=product.pk)
+        return redirect('product_detail', pk=pk)
     
     if request.method == 'POST':
         bid_amount = request.POST.get('bid_amount')
         
         try:
-            # Create bid
-            bid = Bid(
-                product=product,
-                user=request.user,
-                amount=bid_amount,
-                package=product.package,
-                appraisal_category=request.POST.get('appraisal_category', ''),
-                appraisal_value=request.POST.get('appraisal_value', None),
-                fullness_applied=request.POST.get('fullness_applied', '')
-            )
-            bid.full_clean()
-            bid.save()
-            
-            # Update product current bid
-            product.current_item_bid = bid.amount
-            product.save()
+            with BID_SECONDS.time():
+                bid = Bid(
+                    product_id=pk,
+                    user=request.user,
+                    amount=bid_amount,
+                    appraisal_category=request.POST.get('appraisal_category', ''),
+                    appraisal_value=request.POST.get('appraisal_value') or None,
+                    fullness_applied=request.POST.get('fullness_applied', '')
+                )
+                # No full_clean(): the order book applies the bid rules without loading the product
+                bid.clean_fields(exclude=['product', 'user', 'package'])
+                order_books.place(bid)
+                
+                # The book knows the sales listing the unit, so dropping their pages needs no query
+                invalidate_product(Product(pk=pk, package_id=bid.package_id), order_books.get(pk).sale_ids)
+            BIDS.inc(outcome='accepted')
             
             messages.success(request, f"Your bid of ${bid_amount} has been placed successfully!")
-            return redirect('product_detail', pk=product.pk)
+            if not get_bid_rules().reserve_met(bid.amount, book.reserve_price):
+                messages.info(request, "The seller's reserve price has not been met yet.")
+            return redirect('product_detail', pk=pk)
             
         except ValidationError as e:
-            error_message = str(e)
+            BIDS.inc(outcome='busy' if BUSY_MESSAGE in e.messages else 'rejected')
+            error_message = ' '.join(e.messages)
             messages.error(request, error_message)
-            return redirect('product_detail', pk=product.pk)
+            return redirect('product_detail', pk=pk)
+        except DatabaseError:
+            BIDS.inc(outcome='error')  # e.g. the database stayed locked past its timeout
+            raise
     
-    return redirect('product_detail', pk=product.pk)
+    return redirect('product_detail', pk=pk)
+
+
+# ============================================
+# WATCHLIST VIEWS
+# ============================================
+
+@require_POST
+def toggle_favorite(request, pk):
+    """Watch or stop watching one catalytic converter from its detail page"""
+    if not request.user.is_authenticated:
+        messages.error(request, "You must be logged in to use favorites.")
+        return redirect('login')
+    
+    if pk in watched_ids(request.user):
+        unwatch(request.user, [pk])
+        messages.success(request, "Removed from your favorites.")
+    elif watch(request.user, [pk]):
+        messages.success(request, "Added to your favorites.")
+    else:
+        raise Http404("No product found matching the query")
+    return redirect('product_detail', pk=pk)
+
+
+@require_POST
+def watchlist_add(request):
+    """Watch every product posted as a 'product' field"""
+    return _update_watchlist(request, watch)
+
+
+@require_POST
+def watchlist_remove(request):
+    """Stop watching every product posted as a 'product' field"""
+    return _update_watchlist(request, unwatch)
+
+
+def _update_watchlist(request, change):
+    wants_json = 'application/json' in request.headers.get('Accept', '')
+    if not request.user.is_authenticated:
+        if wants_json:
+            return JsonResponse({'error': 'Login required'}, status=403)
+        messages.error(request, "You must be logged in to use favorites.")
+        return redirect('login')
+    
+    product_ids = []
+    for value in request.POST.getlist('product'):
+        try:
+            product_ids.append(int(value))
+        except ValueError:
+            pass
+    changed = change(request.user, product_ids)
+    
+    if wants_json:
+        return JsonResponse({'changed': changed, 'watched': sorted(watched_ids(request.user))})
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        return redirect(next_url)
+    return redirect('favorites')
 
 
 # ============================================
@@ -265,6 +516,15 @@ class SaleListView(ListView):
         if zip_code:
             queryset = queryset.filter(zip_code__icontains=zip_code)
         
+        # Filter by distance from a postal code or place (e.g. ?near=Thunder Bay&radius=200)
+        self.origin = PostalCode.locate(self.request.GET.get('near'))
+        if self.origin:
+            try:
+                radius = float(self.request.GET.get('radius') or DEFAULT_SEARCH_RADIUS_KM)
+            except ValueError:
+                radius = DEFAULT_SEARCH_RADIUS_KM
+            queryset = within_radius(queryset, self.origin.latitude, self.origin.longitude, radius)
+        
         # Filter by seller type
         seller_type = self.request.GET.get('seller_type')
         if seller_type:
@@ -276,6 +536,8 @@ class SaleListView(ListView):
             queryset = queryset.order_by('bid_due_date')
         elif sort == 'unit_count':
             queryset = queryset.order_by('-unit_count')
+        elif self.origin:
+            queryset = queryset.order_by('distance_km')
         else:
             queryset = queryset.order_by('-created_at')
         
@@ -284,6 +546,8 @@ class SaleListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['seller_types'] = Sale.SELLER_TYPE_CHOICES
+        context['origin'] = self.origin
+        context['radius'] = self.request.GET.get('radius') or DEFAULT_SEARCH_RADIUS_KM
         return context
 
 
@@ -293,11 +557,130 @@ class SaleDetailView(DetailView):
     template_name = 'auctions/sale_detail.html'
     context_object_name = 'sale'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        sale = self.get_object()
+    def get_object(self, queryset=None):
+        self.detail = get_or_compute(sale_detail_key(self.kwargs['pk']), self.build_detail)
+        return self.detail['sale']
+    
+    def build_detail(self):
+        sale = super().get_object()
         
         # Get all products in this sale
-        context['products'] = Product.objects.filter(package__in=sale.packages.all())
-        
+        products = list(Product.objects.filter(package__in=sale.packages.all()))
+        return {'sale': sale, 'products': products}
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['products'] = self.detail['products']
+        context['leaderboard'] = get_or_compute(
+            sale_leaderboard_key(self.object.pk), lambda: list(self.object.leaderboard())
+        )
         return context
+
+
+# ============================================
+# ASYNC (ASGI) VIEWS
+# ============================================
+
+async def _fetch_list(queryset):
+    """Evaluate a queryset through the async ORM"""
+    return [obj async for obj in queryset]
+
+
+class AsyncProductListView(ProductListView):
+    """ASGI version of the product list
+
+    The async ORM runs every query through sync_to_async on the one shared
+    sync thread, so the queries still run one after another; what ASGI
+    saves is a worker per slow client, not query time.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        paginator = self.get_paginator(self.object_list, self.paginate_by)
+
+        page_number = self.kwargs.get(self.page_kwarg) or request.GET.get(self.page_kwarg) or 1
+        if page_number != 'last':
+            try:
+                page_number = int(page_number)
+            except ValueError:
+                raise Http404("Page is not 'last', nor can it be converted to an int.")
+
+        # The page rows, the total count and the sidebar options don't depend on
+        # each other, so they are queued on the sync thread in one await; they run
+        # there back to back, not in parallel.
+        bottom = (page_number - 1) * self.paginate_by if page_number != 'last' else 0
+        products, total, categories, packages, counts, watched = await asyncio.gather(
+            _fetch_list(self.object_list[bottom:bottom + self.paginate_by]),
+            self.object_list.acount(),
+            _fetch_list(Category.objects.all()),
+            _fetch_list(Package.objects.all()),
+            sync_to_async(self.get_facet_counts)(),
+            sync_to_async(watched_ids)(request.user),
+        )
+        paginator.count = total
+
+        try:
+            page = paginator.page(paginator.num_pages if page_number == 'last' else page_number)
+        except InvalidPage as e:
+            raise Http404(f"Invalid page ({page_number}): {e}")
+        if page_number == 'last':
+            products = await _fetch_list(page.object_list)
+        page.object_list = products
+
+        context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': products,
+            self.context_object_name: products,
+            'categories': categories,
+            'packages': packages,
+            'search_query': request.GET.get('search', ''),
+            'facets': facet_options(counts, categories, packages),
+            'watched_ids': watched,
+            'view': self,
+        }
+        # Templates still touch lazy relations (images, user), so rendering
+        # runs on the sync thread where the ORM is allowed.
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
+class AsyncProductDetailView(ProductDetailView):
+    """ASGI version of the product detail; its queries run back to back on the sync thread, as above"""
+
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs.get(self.pk_url_kwarg)
+
+        async def build_detail():
+            bids = Bid.objects.filter(product_id=pk)
+            try:
+                product, bid_list, bid_count, rules = await asyncio.gather(
+                    Product.objects.select_related('category', 'seller', 'package').aget(pk=pk),
+                    _fetch_list(bids.order_by('-amount')),
+                    bids.acount(),
+                    sync_to_async(get_bid_rules)(),
+                )
+            except Product.DoesNotExist:
+                raise Http404("No product found matching the query")
+            return {
+                'product': product,
+                'bids': bid_list,
+                'bid_count': bid_count,
+                'minimum_bid': _minimum_bid(rules, product),
+            }
+
+        detail, watched = await asyncio.gather(
+            aget_or_compute(product_detail_key(pk), build_detail),
+            sync_to_async(watched_ids)(request.user),
+        )
+        self.object = detail['product']
+        context = {
+            'object': self.object,
+            self.context_object_name: self.object,
+            'bids': detail['bids'],
+            'bid_count': detail['bid_count'],
+            'minimum_bid': detail['minimum_bid'],
+            'is_favorited': self.object.pk in watched,
+            'view': self,
+        }
+        return await sync_to_async(render)(request, self.template_name, context)
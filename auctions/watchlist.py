@@ -0,0 +1,97 @@
+# SMASH Marketplace - Watchlist
+# Scrap Metal Auction Sales Hub
+# File: auctions/watchlist.py
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate, product_detail_key
+from .models import Favorite, Product
+
+
+# Most products one add/remove request may change
+MAX_BATCH = 200
+
+
+def watchlist_key(user_id):
+    return f'auctions:watchlist:{user_id}'
+
+
+def watched_ids(user):
+    """Ids of the products the user watches, from the cache or one query"""
+    if not user.is_authenticated:
+        return frozenset()
+    key = watchlist_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Favorite.objects.filter(user=user).values_list('product_id', flat=True))
+        cache.set(key, ids, settings.WATCHLIST_CACHE_TIMEOUT)
+    return ids
+
+
+def watch(user, product_ids):
+    """Add products to the user's watchlist; returns the ids that were not watched before"""
+    product_ids = set(list(product_ids)[:MAX_BATCH])
+    with transaction.atomic():
+        added = list(
+            Product.objects.filter(pk__in=product_ids)
+            .exclude(favorite__user=user)
+            .values_list('pk', flat=True)
+        )
+        if added:
+            Favorite.objects.bulk_create(
+                [Favorite(user=user, product_id=pk) for pk in added], ignore_conflicts=True
+            )
+            # A concurrent request may have inserted some of these first; count what is there
+            recount(added)
+    _changed(user.pk, added)
+    return added
+
+
+def unwatch(user, product_ids):
+    """Remove products from the user's watchlist; returns the ids that were watched"""
+    product_ids = set(list(product_ids)[:MAX_BATCH])
+    with transaction.atomic():
+        favorites = Favorite.objects.filter(user=user, product_id__in=product_ids)
+        removed = list(favorites.values_list('product_id', flat=True))
+        if removed:
+            # favorite_deleted recounts each product
+            favorites.filter(product_id__in=removed).delete()
+    _changed(user.pk, removed)
+    return removed
+
+
+def recount(product_ids):
+    """Set watcher_count from the Favorite rows themselves, so racing requests cannot double count"""
+    watchers = Favorite.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(n=Count('pk'))
+    Product.objects.filter(pk__in=product_ids).update(
+        watcher_count=Coalesce(Subquery(watchers.values('n')), 0)
+    )
+
+
+def _changed(user_id, product_ids):
+    if not product_ids:
+        return
+    cache.delete(watchlist_key(user_id))
+    # Detail pages show the watcher count; list cards read it from the page query
+    invalidate(*(product_detail_key(pk) for pk in product_ids))
+
+
+@receiver(post_delete, sender=Favorite, dispatch_uid='auctions.watchlist.favorite_deleted')
+def favorite_deleted(sender, instance, **kwargs):
+    """However a favorite goes (unwatch, the admin, a cascade from its user), recount its product"""
+    recount([instance.product_id])
+    cache.delete(watchlist_key(instance.user_id))
+    invalidate(product_detail_key(instance.product_id))
+
+
+@receiver(pre_delete, sender=User, dispatch_uid='auctions.watchlist.user_deleted')
+def forget_user(sender, instance, **kwargs):
+    """Deleting a user cascades to their favorites, which favorite_deleted takes off the counts"""
+    cache.delete(watchlist_key(instance.pk))
@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import *
+from .views import (
+    UserDashboardView, FavoritesView, ProductsOnSaleView, SubmittedBidsView, SettlementHistoryView,
+)
 
 urlpatterns = [
 
@@ -7,6 +9,7 @@ urlpatterns = [
     path('favorites/', FavoritesView.as_view(), name='favorites'),
     path('products_on_sale/', ProductsOnSaleView.as_view(), name='products_on_sale'),
     path('submitted_bids/', SubmittedBidsView.as_view(), name='submitted_bids'),
+    path('settlement_history/', SettlementHistoryView.as_view(), name='settlement_history'),
 
 ]
 
@@ -1,6 +1,7 @@
 from django.views.generic import TemplateView, ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from auctions.models import *
+from auctions.models import Bid, Favorite, Product
+from auctions.archive import bid_history, settlement_history
 
 
 class UserDashboardView(LoginRequiredMixin, TemplateView):
@@ -19,7 +20,7 @@ class FavoritesView(LoginRequiredMixin, ListView):
     context_object_name = 'favorites'
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.filter(user=self.request.user).select_related('product')
 
 
 class ProductsOnSaleView(LoginRequiredMixin, ListView):
@@ -35,4 +36,12 @@ class SubmittedBidsView(LoginRequiredMixin, ListView):
     context_object_name = 'bids_submitted'
 
     def get_queryset(self):
-        return Bid.objects.filter(user=self.request.user)
+        return bid_history(self.request.user)
+
+
+class SettlementHistoryView(LoginRequiredMixin, ListView):
+    template_name = 'user_dashboard/settlement_history.html'
+    context_object_name = 'settlements'
+
+    def get_queryset(self):
+        return settlement_history(self.request.user)